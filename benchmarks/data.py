@@ -0,0 +1,101 @@
+import os
+from typing import List
+
+import numpy as np
+
+
+def observations(num_timesteps: int, num_envs: int = 16, dim: int = 3, seed: int = 0) -> np.ndarray:
+    """
+    Random walks, as observations of shape (num_timesteps, num_envs, dim).
+
+    :param num_timesteps: Number of timesteps
+    :type num_timesteps: int
+    :param num_envs: Number of envs, defaults to 16
+    :type num_envs: int, optional
+    :param dim: Dimension of the observations, defaults to 3
+    :type dim: int, optional
+    :param seed: The seed, defaults to 0
+    :type seed: int, optional
+    :rtype: np.ndarray
+    """
+    rng = np.random.default_rng(seed)
+    return np.cumsum(rng.normal(scale=0.05, size=(num_timesteps, num_envs, dim)), axis=0)
+
+
+def returns(num_runs: int, num_timesteps: int, seed: int = 0) -> np.ndarray:
+    """
+    Noisy learning curves, as a matrix of shape (num_runs, num_timesteps).
+
+    :param num_runs: Number of runs
+    :type num_runs: int
+    :param num_timesteps: Number of timesteps
+    :type num_timesteps: int
+    :param seed: The seed, defaults to 0
+    :type seed: int, optional
+    :rtype: np.ndarray
+    """
+    rng = np.random.default_rng(seed)
+    progress = np.log1p(np.arange(num_timesteps) / max(1, num_timesteps) * 10)
+    return progress + rng.normal(scale=0.3, size=(num_runs, num_timesteps))
+
+
+def positions(num_positions: int, seed: int = 0) -> np.ndarray:
+    """
+    Positions in the maze, as an array of shape (num_positions, 2).
+
+    :param num_positions: Number of positions
+    :type num_positions: int
+    :param seed: The seed, defaults to 0
+    :type seed: int, optional
+    :rtype: np.ndarray
+    """
+    rng = np.random.default_rng(seed)
+    return np.clip(rng.normal(scale=5.0, size=(num_positions, 2)), -12.5, 12.5)
+
+
+def walls() -> np.ndarray:
+    """
+    The walls of a square maze with a wall in the middle, as an array of shape (num_walls, 2, 2).
+
+    :rtype: np.ndarray
+    """
+    return np.array(
+        [
+            [[-12, -12], [12, -12]],
+            [[12, -12], [12, 12]],
+            [[12, 12], [-12, 12]],
+            [[-12, 12], [-12, -12]],
+            [[-4, -12], [-4, 4]],
+        ],
+        dtype=np.float64,
+    )
+
+
+def write_evaluations(directory: str, num_runs: int, num_evals: int, num_episodes: int = 10) -> List[str]:
+    """
+    Write SB3-like evaluations.npz files, one per run.
+
+    :param directory: The output directory
+    :type directory: str
+    :param num_runs: Number of runs
+    :type num_runs: int
+    :param num_evals: Number of evaluations per run
+    :type num_evals: int
+    :param num_episodes: Number of episodes per evaluation, defaults to 10
+    :type num_episodes: int, optional
+    :return: The files
+    :rtype: List[str]
+    """
+    rng = np.random.default_rng(0)
+    files = []
+    for run in range(num_runs):
+        file = os.path.join(directory, f"{run}", "evaluations.npz")
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        np.savez(
+            file,
+            timesteps=np.arange(num_evals) * 1000,
+            results=rng.normal(size=(num_evals, num_episodes)),
+            ep_lengths=np.full((num_evals, num_episodes), 1000),
+        )
+        files.append(file)
+    return files
@@ -0,0 +1,154 @@
+import argparse
+import datetime
+import fnmatch
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.suite import BENCHMARKS, SCALES
+
+
+def _commit() -> Optional[str]:
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+
+def measure(func, repeat: int = 5, max_time: float = 10.0) -> Dict:
+    """
+    Measure the peak memory and the wall time of a function.
+
+    The peak memory is measured with tracemalloc on a first call, which also serves as a warm-up. The function is
+    then timed up to repeat times, stopping earlier once max_time seconds have been spent.
+
+    :param func: The function, without arguments
+    :param repeat: Maximum number of timed calls, defaults to 5
+    :type repeat: int, optional
+    :param max_time: Time budget of the timed calls, in seconds, defaults to 10.0
+    :type max_time: float, optional
+    :return: The times in seconds and the peak memory in bytes
+    :rtype: Dict
+    """
+    tracemalloc.start()
+    try:
+        func()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    times = []
+    while len(times) < repeat and sum(times) < max_time:
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {"times": times, "peak_memory": peak_memory}
+
+
+def run(scale: str, pattern: str = "*", repeat: int = 5, max_time: float = 10.0) -> List[Dict]:
+    """
+    Run the benchmarks whose name matches the pattern at a scale.
+
+    :param scale: The scale, one of SCALES
+    :type scale: str
+    :param pattern: A shell-style pattern on the benchmark names, defaults to "*"
+    :type pattern: str, optional
+    :return: One result per benchmark
+    :rtype: List[Dict]
+    """
+    results = []
+    for bench in BENCHMARKS:
+        if not fnmatch.fnmatch(bench.name, pattern):
+            continue
+        func, num_items, params = bench.setup(SCALES[scale])
+        result = measure(func, repeat, max_time)
+        median = float(np.median(result["times"]))
+        result.update(
+            name=bench.name,
+            params=params,
+            num_items=num_items,
+            min=min(result["times"]),
+            median=median,
+            throughput=num_items / median if median > 0 else float("inf"),
+        )
+        results.append(result)
+        print(
+            f"{bench.name:<32} {median * 1e3:>12.2f} ms {result['throughput']:>14.4g} items/s "
+            f"{result['peak_memory'] / 2**20:>10.1f} MiB"
+        )
+        del func
+    return results
+
+
+def compare(baseline: Dict, current: Dict) -> None:
+    """
+    Print the ratio of the median times and peak memories of two runs, for the benchmarks present in both.
+
+    :param baseline: The baseline, as written by main()
+    :type baseline: Dict
+    :param current: The current results, as written by main()
+    :type current: Dict
+    """
+    baseline_results = {result["name"]: result for result in baseline["results"]}
+    print(f"{'benchmark':<32} {'time':>10} {'memory':>10}  ({baseline['commit']} -> {current['commit']})")
+    for result in current["results"]:
+        base = baseline_results.get(result["name"])
+        if base is None:
+            continue
+        time_ratio = result["median"] / base["median"] if base["median"] > 0 else float("nan")
+        memory_ratio = result["peak_memory"] / base["peak_memory"] if base["peak_memory"] > 0 else float("nan")
+        print(f"{result['name']:<32} {time_ratio:>9.2f}x {memory_ratio:>9.2f}x")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths of toolbox on synthetic data.")
+    parser.add_argument("--scale", default="small", choices=list(SCALES))
+    parser.add_argument("-k", "--filter", default="*", help="Shell-style pattern on the benchmark names")
+    parser.add_argument("--repeat", type=int, default=5, help="Maximum number of timed calls per benchmark")
+    parser.add_argument("--max-time", type=float, default=10.0, help="Time budget per benchmark, in seconds")
+    parser.add_argument("-o", "--output", help="Output JSON file, defaults to benchmarks/results/{commit}-{scale}.json")
+    parser.add_argument("--compare", help="Baseline JSON file to compare the results with")
+    parser.add_argument("--input", help="Compare this JSON file with the baseline instead of running the benchmarks")
+    args = parser.parse_args(argv)
+
+    if args.input is not None:
+        with open(args.input) as f:
+            current = json.load(f)
+    else:
+        commit = _commit()
+        current = {
+            "commit": commit,
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "scale": args.scale,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "results": run(args.scale, args.filter, args.repeat, args.max_time),
+        }
+        output = args.output
+        if output is None:
+            output = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", f"{commit}-{args.scale}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"Results written to {output}")
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            compare(json.load(f), current)
+
+
+if __name__ == "__main__":
+    main()
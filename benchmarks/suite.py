@@ -0,0 +1,223 @@
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+from benchmarks import data
+
+# Number of environment steps and number of runs of the synthetic data
+SCALES = {
+    "small": {"steps": 10**3, "runs": 5},
+    "medium": {"steps": 10**5, "runs": 20},
+    "large": {"steps": 10**7, "runs": 100},
+}
+
+# Steps between two evaluations, as with an SB3 EvalCallback
+EVAL_FREQ = 1000
+
+
+class Benchmark(NamedTuple):
+    name: str
+    setup: Callable[[Dict[str, int]], Tuple[Callable[[], object], int, Dict[str, int]]]
+
+
+BENCHMARKS: List[Benchmark] = []
+
+
+def benchmark(name: str) -> Callable:
+    """
+    Register a benchmark.
+
+    The decorated function takes a scale and returns the function to time, the number of items it processes (for the
+    throughput), and the parameters of the synthetic data.
+    """
+
+    def decorator(setup: Callable) -> Callable:
+        BENCHMARKS.append(Benchmark(name, setup))
+        return setup
+
+    return decorator
+
+
+def _num_evals(scale: Dict[str, int]) -> int:
+    return max(10, scale["steps"] // EVAL_FREQ)
+
+
+@benchmark("coverage.cumulative_coverage")
+def coverage_cumulative(scale):
+    from toolbox.coverage import cumulative_coverage
+
+    num_envs = 16
+    observations = data.observations(max(1, scale["steps"] // num_envs), num_envs)
+    params = {"num_timesteps": observations.shape[0], "num_envs": num_envs, "dim": 3}
+    return lambda: cumulative_coverage(observations, cell_size=0.1), observations.shape[0] * num_envs, params
+
+
+@benchmark("coverage.tracker")
+def coverage_tracker(scale):
+    from toolbox.coverage import CoverageTracker
+
+    num_envs, chunk_size = 16, 1024
+    observations = data.observations(max(1, scale["steps"] // num_envs), num_envs)
+
+    def run():
+        tracker = CoverageTracker(cell_size=0.1)
+        for start in range(0, observations.shape[0], chunk_size):
+            tracker.update(observations[start : start + chunk_size])
+
+    params = {"num_timesteps": observations.shape[0], "num_envs": num_envs, "dim": 3, "chunk_size": chunk_size}
+    return run, observations.shape[0] * num_envs, params
+
+
+@benchmark("coverage.exploration_stats")
+def coverage_exploration_stats(scale):
+    from toolbox.coverage import exploration_stats
+
+    num_envs = 16
+    observations = data.observations(max(1, scale["steps"] // num_envs), num_envs)
+    params = {"num_timesteps": observations.shape[0], "num_envs": num_envs, "dim": 3}
+    return lambda: exploration_stats(observations, cell_size=0.1), observations.shape[0] * num_envs, params
+
+
+@benchmark("bootstrap.iqm")
+def bootstrap_iqm(scale):
+    from toolbox.to_dat import iqm
+
+    values = data.returns(scale["runs"], _num_evals(scale))
+    params = {"num_runs": values.shape[0], "num_timesteps": values.shape[1], "reps": 1000}
+    return lambda: iqm(values, reps=1000, seed=0), values.size, params
+
+
+@benchmark("bootstrap.performance_profile")
+def bootstrap_performance_profile(scale):
+    from toolbox.to_dat import performance_profile
+
+    values = data.returns(scale["runs"], _num_evals(scale))
+    thresholds = np.linspace(values.min(), values.max(), 50)
+    params = {"num_runs": values.shape[0], "num_timesteps": values.shape[1], "num_thresholds": 50, "reps": 1000}
+    return lambda: performance_profile(values, thresholds, reps=1000, seed=0), values.size, params
+
+
+@benchmark("loading.load_evals")
+def loading_load_evals(scale):
+    from toolbox.to_dat import load_evals
+
+    # Kept alive by the closure, and removed when the benchmark is garbage collected
+    directory = tempfile.TemporaryDirectory()
+    num_evals = _num_evals(scale)
+    files = data.write_evaluations(directory.name, scale["runs"], num_evals)
+
+    def run():
+        directory.name  # Keep the directory alive
+        return load_evals(files)
+
+    return run, scale["runs"] * num_evals, {"num_runs": scale["runs"], "num_evals": num_evals, "num_episodes": 10}
+
+
+def _downsampling(method):
+    def setup(scale):
+        from toolbox.to_dat import rescale
+
+        num_runs = 5  # The cost is driven by the number of timesteps
+        values = data.returns(num_runs, scale["steps"])
+        timesteps = np.arange(scale["steps"])
+        target_length = min(1000, scale["steps"] // 2)
+        params = {"num_runs": num_runs, "num_timesteps": scale["steps"], "target_length": target_length}
+        return lambda: rescale(values, timesteps, target_length, method), values.size, params
+
+    return setup
+
+
+for _method in ("nearest", "minmax", "lttb"):
+    benchmark(f"downsampling.{_method}")(_downsampling(_method))
+
+
+@benchmark("writing.save_median")
+def writing_save_median(scale):
+    from toolbox.to_dat import save_median
+
+    directory = tempfile.TemporaryDirectory()
+    values = data.returns(scale["runs"], _num_evals(scale))
+    filename = os.path.join(directory.name, "median.dat")
+
+    def run():
+        directory.name  # Keep the directory alive
+        save_median(values, step=EVAL_FREQ, filename=filename, quantiles=[0.05, 0.95])
+
+    return run, values.size, {"num_runs": values.shape[0], "num_timesteps": values.shape[1], "num_quantiles": 2}
+
+
+@benchmark("writing.write_dat")
+def writing_write_dat(scale):
+    from toolbox.dat import write_dat
+
+    # One row per step, as save_iqm writes them without downsampling
+    directory = tempfile.TemporaryDirectory()
+    returns = data.returns(3, scale["steps"])
+    out = np.vstack((np.arange(scale["steps"]) * EVAL_FREQ, *returns)).transpose()
+    filename = os.path.join(directory.name, "iqm.dat")
+
+    def run():
+        directory.name  # Keep the directory alive
+        write_dat(filename, out, "%d %.3f %.3f %.3f", "timestep iqm lowq highq")
+
+    return run, out.shape[0], {"num_rows": out.shape[0]}
+
+
+@benchmark("rendering.render")
+def rendering_render(scale):
+    from toolbox.render_maze import render
+
+    positions, walls = data.positions(scale["steps"]), data.walls()
+    return lambda: render(positions, walls), positions.shape[0], {"num_positions": positions.shape[0]}
+
+
+@benchmark("rendering.render_heatmap")
+def rendering_render_heatmap(scale):
+    from toolbox.render_maze import render_heatmap
+
+    positions, walls = data.positions(scale["steps"]), data.walls()
+    return lambda: render_heatmap(positions, walls), positions.shape[0], {"num_positions": positions.shape[0]}
+
+
+@benchmark("planning.plan_architecture")
+def planning_plan_architecture(scale):
+    from toolbox.torch_utils import Conv2d, Pool2d, plan_architecture
+
+    # 4 kernel sizes x 4 strides x input sizes, capped to bound the memory of the plan
+    num_inputs = max(1, min(scale["steps"], 10**6) // 16)
+    input_size = (32 + np.arange(num_inputs) % 256)[:, None, None]
+    kernel_size, stride = np.array([3, 5, 7, 8])[:, None], np.array([1, 2, 3, 4])
+    layers = [Conv2d(32, kernel_size, stride), Pool2d(2), Conv2d(64, 3, 1), Conv2d(64, 3, 1)]
+    num_candidates = num_inputs * 16
+    return lambda: plan_architecture(layers, input_size, 3), num_candidates, {"num_candidates": num_candidates}
+
+
+# Modules that importing each module must not pull in, as they are slow to import and only needed by some functions
+IMPORTS = {
+    "toolbox": ("numpy", "pygame", "PIL", "concurrent.futures"),
+    "toolbox.torch_utils": ("pygame", "PIL", "concurrent.futures"),
+    "toolbox.coverage": ("pygame", "PIL", "concurrent.futures"),
+    "toolbox.to_dat": ("pygame", "PIL", "concurrent.futures", "zipfile"),
+    "toolbox.render_maze": ("pygame", "PIL", "concurrent.futures"),
+}
+
+
+def _import(module, forbidden):
+    def setup(scale):
+        # Import in a fresh interpreter, and fail if a forbidden module was imported
+        code = (
+            f"import sys; import {module}; "
+            f"loaded = [name for name in {forbidden!r} if name in sys.modules]; "
+            "sys.exit(f'unexpected imports: {loaded}' if loaded else 0)"
+        )
+        return lambda: subprocess.run([sys.executable, "-c", code], check=True), 1, {}
+
+    return setup
+
+
+for _module, _forbidden in IMPORTS.items():
+    benchmark(f"import.{_module}")(_import(_module, _forbidden))
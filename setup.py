@@ -6,8 +6,11 @@ setup(
     url="https://github.com/qgallouedec/toolbox",
     description="Some usefull tools",
     long_description=open("README.md").read(),
-    install_requires=["numpy", "scipy", "rliable", "pygame", "Pillow"],
+    install_requires=["numpy", "pygame", "Pillow"],
     extras_require={
         "extras": ["pytest", "black", "isort"],
     },
+    entry_points={
+        "console_scripts": ["toolbox-dat=toolbox.batch:main"],
+    },
 )
@@ -0,0 +1,32 @@
+import os
+
+import numpy as np
+
+from toolbox.batch import main
+
+
+def _write_tree(root, num_runs=3, num_evals=20, num_episodes=5):
+    rng = np.random.default_rng(0)
+    for seed in range(num_runs):
+        run_dir = os.path.join(root, "ppo", "maze", str(seed))
+        os.makedirs(run_dir)
+        results = rng.random((num_evals, num_episodes)) + np.arange(num_evals)[:, None]
+        np.savez(os.path.join(run_dir, "evaluations.npz"), timesteps=np.arange(num_evals) * 1000, results=results)
+
+
+def test_profile_of_final_evaluation(tmp_path):
+    _write_tree(str(tmp_path))
+    main([str(tmp_path), "--seed", "0", "--workers", "1"])
+    # The final evaluation returns are in [19, 20), the earlier ones below
+    thresholds = np.loadtxt(tmp_path / "ppo" / "maze" / "profile.dat", skiprows=1)[:, 0]
+    assert thresholds.min() >= 19
+
+
+def test_rerun_with_other_options(tmp_path, capsys):
+    _write_tree(str(tmp_path))
+    main([str(tmp_path), "--seed", "0", "--workers", "1"])
+    main([str(tmp_path), "--seed", "0", "--workers", "1"])
+    assert "up to date" in capsys.readouterr().out
+    main([str(tmp_path), "--seed", "0", "--workers", "1", "--target-length", "5"])
+    assert "up to date" not in capsys.readouterr().out
+    assert len(np.loadtxt(tmp_path / "ppo" / "maze" / "iqm.dat", skiprows=1)) == 5
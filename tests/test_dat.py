@@ -0,0 +1,29 @@
+import os
+
+import numpy as np
+
+from toolbox.dat import load_dat, sidecar_filename, write_dat
+
+
+def test_load_dat_sidecar(tmp_path):
+    filename = str(tmp_path / "iqm.dat")
+    out = np.array([[0, 0.123456789], [1000, 0.5]])
+    write_dat(filename, out, "%d %.3f", "timestep iqm", sidecar=True)
+    write_dat(filename, out + 1, "%d %.3f", "timestep iqm", append=True, sidecar=True)
+    values = load_dat(filename)
+    assert isinstance(values, np.memmap)
+    np.testing.assert_array_equal(values["iqm"], [0.123456789, 0.5, 1.123456789, 1.5])
+
+
+def test_load_dat_stale_sidecar_same_mtime(tmp_path):
+    # With coarse timestamps, the .dat file appended to without the sidecar can keep the same modification time
+    filename = str(tmp_path / "iqm.dat")
+    out = np.array([[0, 0.123456789], [1000, 0.5]])
+    write_dat(filename, out, "%d %.3f", "timestep iqm", sidecar=True)
+    stat = os.stat(filename)
+    write_dat(filename, out + 1, "%d %.3f", "timestep iqm", append=True)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert os.stat(sidecar_filename(filename)).st_mtime_ns == os.stat(filename).st_mtime_ns
+    values = load_dat(filename)
+    assert not isinstance(values, np.memmap)
+    np.testing.assert_array_equal(values["iqm"], [0.123, 0.5, 1.123, 1.5])
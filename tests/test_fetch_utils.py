@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+gym = pytest.importorskip("gym")
+
+from toolbox.fetch_utils import FetchWrapper, VecSiteRecorder, highest_so_far  # noqa: E402
+
+
+class _Data:
+    def __init__(self, sites):
+        self.sites = sites
+
+    def get_site_xpos(self, site):
+        return self.sites[site].copy()
+
+
+class _Sim:
+    def __init__(self, sites):
+        self.data = _Data(sites)
+
+
+class _SiteEnv(gym.Env):
+    # Moves the gripper up and the object up by the action at every step
+    observation_space = gym.spaces.Box(-np.inf, np.inf, (3,))
+    action_space = gym.spaces.Box(-1.0, 1.0, (1,))
+
+    def __init__(self, offset):
+        self.sim = _Sim({"object0": np.array([offset, 0.0, 0.0]), "robot0:grip": np.array([offset, 0.0, 1.0])})
+
+    def reset(self):
+        return np.zeros(3)
+
+    def step(self, action):
+        self.sim.data.sites["object0"][2] += action[0]
+        self.sim.data.sites["robot0:grip"][2] += 1.0
+        return np.zeros(3), 0.0, False, {}
+
+
+def test_recorder_stacks_wrapper_infos():
+    # The positions are recorded in the main process from the infos, as with SubprocVecEnv
+    envs = [FetchWrapper(_SiteEnv(offset), sites=("robot0:grip", "object0")) for offset in range(3)]
+    recorder = VecSiteRecorder(n_envs=3, num_sites=2, capacity=2)
+    actions = np.array([[0.5, -1.0, 0.0], [-1.0, 1.0, 0.25], [0.25, 0.5, 1.0]])
+    for step_actions in actions:
+        recorder.record([env.step([action])[3] for env, action in zip(envs, step_actions)])
+    positions = recorder.site_positions
+    assert positions.shape == (3, 3, 2, 3)
+    np.testing.assert_array_equal(positions[:, 0], envs[0].site_positions)
+    np.testing.assert_array_equal(positions[-1, :, 0, 0], np.arange(3))
+    # The object is the second site, the gripper always goes higher
+    np.testing.assert_array_equal(highest_so_far(positions, site=1), [0.5, 0.5, 1.25])
+    np.testing.assert_array_equal(highest_so_far(positions, site=0), [2.0, 3.0, 4.0])
+
+
+def test_highest_so_far_requires_sites_axis():
+    envs = [FetchWrapper(_SiteEnv(0), sites=("robot0:grip", "object0"))]
+    envs[0].step([1.0])
+    with pytest.raises(ValueError):
+        highest_so_far(envs[0].site_positions)
@@ -0,0 +1,18 @@
+import subprocess
+import sys
+
+import pytest
+
+
+@pytest.mark.parametrize("name", ["to_dat", "torch_utils", "coverage", "profiling"])
+def test_submodule_attribute(name):
+    # A plain import of the package gives access to its submodules, as when they were imported eagerly
+    code = f"import toolbox; assert toolbox.{name}.__name__ == 'toolbox.{name}'"
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_missing_attribute():
+    import toolbox
+
+    with pytest.raises(AttributeError):
+        toolbox.does_not_exist
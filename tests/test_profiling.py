@@ -0,0 +1,31 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+# A profiled process starting another one, as a process pool does. Only the child calls profiled functions.
+PARENT = """
+import subprocess, sys
+import toolbox.profiling
+
+subprocess.run([sys.executable, "-c", "import numpy as np; from toolbox.to_dat import iqm; iqm(np.ones((3, 4)))"], check=True)
+"""
+
+
+@pytest.mark.parametrize("filename", ["trace.json", "trace_{pid}.json"])
+def test_environment_child_processes(tmp_path, filename):
+    env = {key: value for key, value in os.environ.items() if not key.startswith("TOOLBOX_PROFILE")}
+    env["TOOLBOX_PROFILE"] = str(tmp_path / filename)
+    parent = subprocess.Popen([sys.executable, "-c", PARENT], env=env)
+    assert parent.wait() == 0
+    traces = sorted(tmp_path.iterdir())
+    if "{pid}" in filename:
+        # Each process dumps its own trace, and only the child has events
+        assert len(traces) == 1
+        pids = {event["pid"] for event in json.loads(traces[0].read_text())["traceEvents"]}
+        assert len(pids) == 1 and parent.pid not in pids
+    else:
+        # The child would overwrite the trace of the profiled process
+        assert traces == []
@@ -0,0 +1,27 @@
+import subprocess
+import sys
+
+import pytest
+
+pygame = pytest.importorskip("pygame")
+
+
+def test_color_is_pygame_color():
+    from toolbox.render_maze import BLACK, GREEN, Color
+
+    assert Color is pygame.Color
+    assert Color(0, 0, 0) == BLACK
+    assert isinstance(GREEN, pygame.Color) and GREEN.g == 200
+
+
+def test_import_does_not_load_pygame():
+    code = "import sys, toolbox.render_maze; assert 'pygame' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_save_frames_empty(tmp_path):
+    from toolbox.render_maze import MazeRenderer
+
+    renderer = MazeRenderer(walls=[[[0, 0], [100, 0]]])
+    with pytest.raises(ValueError):
+        renderer.save_frames([], str(tmp_path / "frames.gif"))
@@ -0,0 +1,117 @@
+import builtins
+import io
+import os
+
+import numpy as np
+import pytest
+
+from toolbox.cache import ResultCache
+from toolbox.to_dat import iqm, load_eval, load_evals, load_evals_padded, rescale, save_iqms, save_median
+
+
+@pytest.mark.parametrize("method", ["nearest", "minmax", "lttb"])
+@pytest.mark.parametrize("target_length", [2, 49, 99, 100, 101, 200])
+def test_rescale_target_length(method, target_length):
+    # The target length can exceed the number of timesteps, even twice
+    values = np.random.default_rng(0).random((3, 50))
+    new_values, new_timesteps = rescale(values, np.arange(50), target_length, method)
+    assert new_values.shape == (3, len(new_timesteps))
+    assert len(new_timesteps) <= max(target_length, 50)
+    assert np.all(np.isin(new_timesteps, np.arange(50)))
+
+
+@pytest.mark.filterwarnings("ignore::FutureWarning")  # random_state of rliable
+def test_iqm_matches_rliable():
+    rly = pytest.importorskip("rliable.library")
+    metrics = pytest.importorskip("rliable.metrics")
+    values = np.random.default_rng(0).normal(size=(10, 5))
+    func = lambda scores: np.array([metrics.aggregate_iqm(s) for s in scores.T])
+    scores, cis = rly.get_interval_estimates({"algo": values}, func, reps=2000, random_state=np.random.RandomState(0))
+    med, lowq, highq = iqm(values, reps=2000, seed=0)
+    np.testing.assert_array_equal(med, scores["algo"])
+    # The resamples differ, so the bounds only agree up to the bootstrap noise
+    width = cis["algo"][1] - cis["algo"][0]
+    np.testing.assert_allclose(lowq, cis["algo"][0], rtol=0, atol=0.15 * width.max())
+    np.testing.assert_allclose(highq, cis["algo"][1], rtol=0, atol=0.15 * width.max())
+
+
+def test_save_median_evaluation_memmaps(tmp_path):
+    # Runs as read by load_eval(mmap=True), of shape (num_evals x num_episodes), streamed by blocks
+    rng = np.random.default_rng(0)
+    files = []
+    for seed, num_evals in enumerate((30, 32)):
+        files.append(str(tmp_path / f"evaluations_{seed}.npz"))
+        np.savez(files[-1], timesteps=np.arange(num_evals) * 1000, results=rng.random((num_evals, 5)))
+    runs = [load_eval(file, mmap=True)[1] for file in files]
+    assert isinstance(runs[0], np.memmap)
+    save_median(runs, step=1000, filename=str(tmp_path / "streamed.dat"), quantiles=[0.1], block_size=7)
+    values = np.stack([run[:30].mean(axis=1) for run in runs])
+    save_median(values, step=1000, filename=str(tmp_path / "reference.dat"), quantiles=[0.1])
+    assert (tmp_path / "streamed.dat").read_bytes() == (tmp_path / "reference.dat").read_bytes()
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_load_eval_opens_file_once(tmp_path, monkeypatch, compress):
+    file = str(tmp_path / "evaluations.npz")
+    (np.savez_compressed if compress else np.savez)(file, timesteps=np.arange(4), results=np.ones((4, 3)))
+    opened = []
+    builtin_open = builtins.open
+
+    def counting_open(name, *args, **kwargs):
+        opened.append(name)
+        return builtin_open(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "open", counting_open)
+    monkeypatch.setattr(io, "open", counting_open)  # Used by zipfile
+    timesteps, values = load_eval(file, mmap=True)
+    assert opened == [file]
+    assert isinstance(values, np.memmap) != compress
+    np.testing.assert_array_equal(values, np.ones((4, 3)))
+
+
+def test_load_evals_padded(tmp_path):
+    files = []
+    for seed, num_evals in enumerate((3, 5)):
+        files.append(str(tmp_path / f"evaluations_{seed}.npz"))
+        np.savez(files[-1], timesteps=np.arange(num_evals), results=np.full((num_evals, 2), seed + 1))
+    timesteps, values = load_evals(files)
+    assert values.shape == (2, 3, 2)
+    timesteps, values, mask = load_evals_padded(files)
+    np.testing.assert_array_equal(timesteps, np.arange(5))
+    np.testing.assert_array_equal(mask, [[True] * 3 + [False] * 2, [True] * 5])
+    assert np.isnan(values[0, 3:]).all() and (values[mask] > 0).all()
+
+
+def test_save_iqms_independent_of_other_groups(tmp_path):
+    # Changing the shape of the values of an (algo, env) does not change the curves of the others
+    rng = np.random.default_rng(0)
+    values = {("a", "x"): rng.random((5, 10)), ("b", "x"): rng.random((5, 12)), ("c", "x"): rng.random((6, 12))}
+    filename = str(tmp_path / "{algo}_{env}.dat")
+    save_iqms(values, filename=filename, seed=0, n_workers=1)
+    before = {algo: (tmp_path / f"{algo}_x.dat").read_bytes() for algo in "bc"}
+    values[("a", "x")] = rng.random((7, 14))
+    save_iqms(values, filename=filename, seed=0, n_workers=1)
+    assert before == {algo: (tmp_path / f"{algo}_x.dat").read_bytes() for algo in "bc"}
+
+
+def test_cache_requires_seed(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    values = np.random.default_rng(0).random((5, 10))
+    iqm(values, reps=100, cache=cache)
+    assert not os.listdir(tmp_path)
+    assert np.array_equal(iqm(values, reps=100, seed=0, cache=cache)[1], iqm(values, reps=100, seed=0, cache=cache)[1])
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_cache_get_evicted(tmp_path, monkeypatch):
+    # An entry removed by another process between the read and the access time update is still returned
+    cache = ResultCache(str(tmp_path))
+    cache.put("key", (np.arange(3),))
+    utime = os.utime
+
+    def evict_then_utime(path, *args, **kwargs):
+        os.remove(path)
+        utime(path, *args, **kwargs)
+
+    monkeypatch.setattr(os, "utime", evict_then_utime)
+    assert np.array_equal(cache.get("key")[0], np.arange(3))
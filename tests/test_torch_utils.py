@@ -0,0 +1,16 @@
+import numpy as np
+import pytest
+
+from toolbox.torch_utils import conv_2d, conv_transpose_2d, pool_2d
+
+
+@pytest.mark.parametrize("scalar", [int, np.int64, np.int32])
+def test_scalar_sizes_apply_to_both_dimensions(scalar):
+    np.testing.assert_array_equal(conv_2d(scalar(84), scalar(8), scalar(4)), [20, 20])
+    np.testing.assert_array_equal(conv_2d(84, scalar(8), 4), [20, 20])
+    np.testing.assert_array_equal(pool_2d(scalar(20), 2, scalar(2)), [10, 10])
+    np.testing.assert_array_equal(conv_transpose_2d(scalar(20), 4, scalar(2), 1), [40, 40])
+
+
+def test_array_sizes():
+    np.testing.assert_array_equal(conv_2d(np.array([84, 80]), 8, 4), [20, 19])
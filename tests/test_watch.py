@@ -0,0 +1,46 @@
+import os
+
+import numpy as np
+import pytest
+
+from toolbox.watch import refresh
+
+
+def test_refresh_incremental(tmp_path):
+    # Refreshing as the evaluations grow gives the same files as a single refresh at the end. The IQM bounds are
+    # bootstrapped over other timesteps, so only the IQM itself is compared.
+    rng = np.random.default_rng(0)
+    runs = [rng.random((40, 5)), rng.random((43, 5)), rng.random((41, 5))]
+    files = [str(tmp_path / f"evaluations_{seed}.npz") for seed in range(len(runs))]
+    for length in (10, 10, 25, 43):
+        for file, run in zip(files, runs):
+            np.savez(file, timesteps=np.arange(min(length, len(run))) * 1000, results=run[:length])
+        refresh(files, str(tmp_path / "iqm.dat"), str(tmp_path / "median.dat"), quantiles=[0.1], seed=0)
+    refresh(files, str(tmp_path / "iqm_full.dat"), str(tmp_path / "median_full.dat"), quantiles=[0.1], seed=0)
+    assert (tmp_path / "median.dat").read_bytes() == (tmp_path / "median_full.dat").read_bytes()
+    iqm, iqm_full = np.loadtxt(tmp_path / "iqm.dat", skiprows=1), np.loadtxt(tmp_path / "iqm_full.dat", skiprows=1)
+    assert len(iqm) == 40
+    np.testing.assert_array_equal(iqm[:, :2], iqm_full[:, :2])
+
+
+def test_watch_retries_partly_written_files(tmp_path, monkeypatch):
+    from toolbox import watch as watch_module
+
+    rng = np.random.default_rng(0)
+    files = [str(tmp_path / str(seed) / "evaluations.npz") for seed in range(2)]
+    for file in files:
+        os.makedirs(os.path.dirname(file))
+        np.savez(file, timesteps=np.arange(10) * 1000, results=rng.random((10, 5)))
+    content = open(files[1], "rb").read()
+    with open(files[1], "wb") as f:
+        f.write(content[: len(content) // 2])
+
+    def finish_writing(interval):
+        with open(files[1], "wb") as f:
+            f.write(content)
+
+    monkeypatch.setattr(watch_module.time, "sleep", finish_writing)
+    iqm_filename, median_filename = str(tmp_path / "iqm.dat"), str(tmp_path / "median.dat")
+    with pytest.warns(UserWarning, match="retrying"):
+        watch_module.watch(str(tmp_path), max_iterations=2, iqm_filename=iqm_filename, median_filename=median_filename)
+    assert len(np.loadtxt(median_filename, skiprows=1)) == 10
@@ -1 +1,51 @@
-from toolbox.to_dat import save_iqm, save_median, save_performance_profile
+import importlib
+
+# The public API is loaded on first access (PEP 562), so that importing a single submodule, such as
+# toolbox.torch_utils, does not pay for the dependencies of the others
+_LAZY_ATTRIBUTES = {
+    "save_iqm": "toolbox.to_dat",
+    "save_iqms": "toolbox.to_dat",
+    "save_median": "toolbox.to_dat",
+    "save_performance_profile": "toolbox.to_dat",
+    "iqm": "toolbox.to_dat",
+    "performance_profile": "toolbox.to_dat",
+    "load_evals": "toolbox.to_dat",
+    "load_evals_padded": "toolbox.to_dat",
+    "ResultCache": "toolbox.cache",
+    "CoverageTracker": "toolbox.coverage",
+    "cumulative_coverage": "toolbox.coverage",
+    "exploration_stats": "toolbox.coverage",
+    "exploration_stats_runs": "toolbox.coverage",
+}
+
+# Submodules, also loaded on first access, so that toolbox.to_dat works after a plain import toolbox
+_LAZY_SUBMODULES = {
+    "batch",
+    "cache",
+    "coverage",
+    "dat",
+    "fetch_utils",
+    "maze_grid",
+    "panda_utils",
+    "profiling",
+    "render_maze",
+    "to_dat",
+    "torch_utils",
+    "watch",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    if name in _LAZY_SUBMODULES:
+        return importlib.import_module(f"{__name__}.{name}")  # Also binds the submodule to the package
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    globals()[name] = value  # Later accesses do not go through __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | _LAZY_SUBMODULES)
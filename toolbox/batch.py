@@ -0,0 +1,205 @@
+import argparse
+import glob
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from toolbox.profiling import profiled
+from toolbox.to_dat import load_evals, save_iqm, save_median, save_performance_profile
+
+OUTPUTS = ("iqm", "median", "profile")
+
+
+def find_runs(root: str, filename: str = "evaluations.npz") -> Dict[Tuple[str, str], List[str]]:
+    """
+    Find the runs of a results tree laid out as algo/env/seed/evaluations.npz.
+
+    :param root: The root of the results tree
+    :type root: str
+    :param filename: The name of the evaluation files, defaults to "evaluations.npz"
+    :type filename: str, optional
+    :return: The evaluation files of every (algo, env), sorted by seed
+    :rtype: Dict[Tuple[str, str], List[str]]
+    """
+    groups = {}
+    for file in sorted(glob.glob(os.path.join(root, "*", "*", "*", filename))):
+        env_dir = os.path.dirname(os.path.dirname(file))
+        algo, env = os.path.basename(os.path.dirname(env_dir)), os.path.basename(env_dir)
+        groups.setdefault((algo, env), []).append(file)
+    return groups
+
+
+def output_files(output_dir: str, algo: str, env: str) -> Dict[str, str]:
+    """
+    Return the .dat files written for an (algo, env).
+
+    :param output_dir: The output directory
+    :type output_dir: str
+    :param algo: The algorithm
+    :type algo: str
+    :param env: The environment
+    :type env: str
+    :return: The filename of each output
+    :rtype: Dict[str, str]
+    """
+    return {output: os.path.join(output_dir, algo, env, output + ".dat") for output in OUTPUTS}
+
+
+def _params_file(outputs: Dict[str, str]) -> str:
+    # The parameters the outputs were written with, next to them
+    return os.path.join(os.path.dirname(outputs["iqm"]), "params.json")
+
+
+def is_up_to_date(files: List[str], outputs: Dict[str, str], params: Optional[Dict] = None) -> bool:
+    """
+    Whether all the outputs exist, are newer than all the inputs, and were written with the same parameters.
+
+    :param files: The input files
+    :type files: List[str]
+    :param outputs: The output files
+    :type outputs: Dict[str, str]
+    :param params: The parameters of process_group, checked against the ones the outputs were written with,
+        defaults to None (not checked)
+    :type params: Optional[Dict], optional
+    :rtype: bool
+    """
+    if not all(os.path.exists(output) for output in outputs.values()):
+        return False
+    if min(os.path.getmtime(output) for output in outputs.values()) <= max(os.path.getmtime(f) for f in files):
+        return False
+    if params is None:
+        return True
+    try:
+        with open(_params_file(outputs)) as f:
+            return json.load(f) == json.loads(json.dumps(params))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False
+
+
+@profiled()
+def process_group(
+    files: List[str],
+    outputs: Dict[str, str],
+    key: str = "results",
+    target_length: Optional[int] = None,
+    downsampling: str = "nearest",
+    quantiles: Optional[List[float]] = None,
+    seed: Optional[int] = None,
+    sidecar: bool = False,
+) -> None:
+    """
+    Load the runs of a group and write its IQM, median and performance profile.
+
+    The runs are truncated to the shortest one. The IQM and the median are computed over the values averaged over
+    the evaluation episodes. The performance profile is the distribution of the returns of the episodes of the
+    final evaluation. The parameters are saved next to the outputs, see is_up_to_date.
+
+    :param files: The evaluation files of the runs
+    :type files: List[str]
+    :param outputs: The output files, as returned by output_files
+    :type outputs: Dict[str, str]
+    :param key: The key of the values, defaults to "results"
+    :type key: str, optional
+    :param target_length: The target number of elements in the output files, defaults to None
+    :type target_length: Optional[int], optional
+    :param downsampling: The downsampling method, see rescale(), defaults to "nearest"
+    :type downsampling: str, optional
+    :param quantiles: The quantiles to save with the median, defaults to None
+    :type quantiles: Optional[List[float]], optional
+    :param seed: Seed of the bootstrap resampling, defaults to None
+    :type seed: Optional[int], optional
+    :param sidecar: Also save the values in full precision to binary sidecars, see toolbox.dat.load_dat,
+        defaults to False
+    :type sidecar: bool, optional
+    """
+    timesteps, values = load_evals(files, key)
+    values = values.reshape(values.shape[0], values.shape[1], -1)
+    final_rewards, values = values[:, -1], values.mean(axis=2)
+    os.makedirs(os.path.dirname(outputs["iqm"]), exist_ok=True)
+    save_iqm(
+        values,
+        timesteps,
+        filename=outputs["iqm"],
+        target_length=target_length,
+        downsampling=downsampling,
+        seed=seed,
+        sidecar=sidecar,
+    )
+    save_median(
+        values,
+        timesteps,
+        filename=outputs["median"],
+        target_length=target_length,
+        downsampling=downsampling,
+        quantiles=quantiles,
+        sidecar=sidecar,
+    )
+    save_performance_profile(
+        final_rewards,
+        np.min(final_rewards),
+        np.max(final_rewards),
+        filename=outputs["profile"],
+        seed=seed,
+        sidecar=sidecar,
+    )
+    params = dict(
+        key=key,
+        target_length=target_length,
+        downsampling=downsampling,
+        quantiles=quantiles,
+        seed=seed,
+        sidecar=sidecar,
+    )
+    with open(_params_file(outputs), "w") as f:
+        json.dump(params, f)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Write the IQM, median and performance profile .dat files of a results tree laid out as "
+        "algo/env/seed/evaluations.npz."
+    )
+    parser.add_argument("root", help="Root of the results tree")
+    parser.add_argument("-o", "--output-dir", help="Output directory, defaults to the root")
+    parser.add_argument("--key", default="results", help="Key of the values in the evaluation files")
+    parser.add_argument("--target-length", type=int, help="Target number of rows of the IQM and median files")
+    parser.add_argument("--downsampling", default="nearest", choices=["nearest", "minmax", "lttb"])
+    parser.add_argument("--quantiles", type=float, nargs="*", help="Quantiles saved with the median")
+    parser.add_argument("--seed", type=int, help="Seed of the bootstrap resampling")
+    parser.add_argument("--workers", type=int, help="Number of worker processes, defaults to the number of processors")
+    parser.add_argument("--sidecar", action="store_true", help="Also write binary .npy sidecars of the .dat files")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Also process the groups whose outputs are newer than their inputs and were written with the same options",
+    )
+    args = parser.parse_args(argv)
+
+    output_dir = args.output_dir if args.output_dir is not None else args.root
+    groups = find_runs(args.root)
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {}
+        for (algo, env), files in groups.items():
+            outputs = output_files(output_dir, algo, env)
+            params = dict(
+                key=args.key,
+                target_length=args.target_length,
+                downsampling=args.downsampling,
+                quantiles=args.quantiles,
+                seed=args.seed,
+                sidecar=args.sidecar,
+            )
+            if not args.force and is_up_to_date(files, outputs, params):
+                print(f"{algo}/{env}: up to date")
+                continue
+            futures[(algo, env)] = executor.submit(process_group, files, outputs, **params)
+        for (algo, env), future in futures.items():
+            future.result()
+            print(f"{algo}/{env}: {len(groups[(algo, env)])} runs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import hashlib
+import os
+import tempfile
+from typing import Any, Callable, Optional, Tuple
+
+import numpy as np
+
+
+class ResultCache:
+    """
+    On-disk cache for the results of aggregate functions such as iqm and performance_profile.
+
+    A result is keyed by a hash of the function name, the values and every parameter, so a result is only
+    reused for identical inputs. When the total size of the cache exceeds max_size, the least recently used
+    results are removed.
+
+    :param directory: The cache directory, defaults to "~/.cache/toolbox"
+    :type directory: Optional[str], optional
+    :param max_size: Maximum total size of the cache in bytes, defaults to 1 GiB
+    :type max_size: int, optional
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_size: int = 2**30) -> None:
+        self.directory = (
+            directory if directory is not None else os.path.join(os.path.expanduser("~"), ".cache", "toolbox")
+        )
+        self.max_size = max_size
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(name: str, values: np.ndarray, **params: Any) -> str:
+        """
+        Return the key of a result.
+
+        :param name: The name of the function
+        :type name: str
+        :param values: The values
+        :type values: np.ndarray
+        :return: The key, as an hexadecimal string
+        :rtype: str
+        """
+        digest = hashlib.sha256(name.encode())
+        for param_name, param in (("values", values), *sorted(params.items())):
+            digest.update(param_name.encode())
+            if isinstance(param, np.ndarray):
+                param = np.ascontiguousarray(param)
+                digest.update(f"{param.dtype.str}{param.shape}".encode())
+                digest.update(param.data)
+            else:
+                digest.update(repr(param).encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".npz")
+
+    def get(self, key: str) -> Optional[Tuple[np.ndarray, ...]]:
+        """
+        Return the result stored under the key, None if there is none.
+
+        :param key: The key
+        :type key: str
+        :return: The result
+        :rtype: Optional[Tuple[np.ndarray, ...]]
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                result = tuple(data[f"arr_{i}"] for i in range(len(data.files)))
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+        try:
+            os.utime(path)  # Mark as recently used
+        except FileNotFoundError:  # Evicted meanwhile by another process
+            pass
+        return result
+
+    def put(self, key: str, result: Tuple[np.ndarray, ...]) -> None:
+        """
+        Store a result under the key, and evict the least recently used results if needed.
+
+        :param key: The key
+        :type key: str
+        :param result: The result
+        :type result: Tuple[np.ndarray, ...]
+        """
+        # Write to a temporary file first, so that concurrent readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, *result)
+        os.replace(tmp_path, self._path(key))
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npz"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+    def call(
+        self, func: Callable[..., Tuple[np.ndarray, ...]], values: np.ndarray, **params: Any
+    ) -> Tuple[np.ndarray, ...]:
+        """
+        Return func(values, **params), from the cache when available.
+
+        :param func: The function
+        :type func: Callable[..., Tuple[np.ndarray, ...]]
+        :param values: The values
+        :type values: np.ndarray
+        :return: The result
+        :rtype: Tuple[np.ndarray, ...]
+        """
+        key = self.key(func.__name__, values, **params)
+        result = self.get(key)
+        if result is None:
+            result = tuple(func(values, **params))
+            self.put(key, result)
+        return result
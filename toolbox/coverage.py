@@ -0,0 +1,246 @@
+from typing import List, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+
+from toolbox.profiling import profiled
+
+
+def discretize(observations: np.ndarray, cell_size: float = 1.0) -> np.ndarray:
+    """
+    Return the integer cell coordinates of the observations.
+
+    :param observations: Observations of any shape, the last axis being the coordinates
+    :type observations: np.ndarray
+    :param cell_size: Size of a cell, defaults to 1.0
+    :type cell_size: float, optional
+    :return: The cells, with the same shape as the observations
+    :rtype: np.ndarray
+    """
+    # Multiply by the inverse rather than dividing, so that floor(x * 10) and cell_size=0.1 agree exactly
+    return np.floor(observations * (1.0 / cell_size)).astype(np.int64)
+
+
+def cell_keys(cells: np.ndarray) -> np.ndarray:
+    """
+    Return one scalar key per cell, such that two cells are equal if and only if their keys are equal.
+
+    The coordinates are packed into a single integer when their range fits in 63 bits. Otherwise,
+    each row is viewed as an opaque structured scalar.
+
+    :param cells: Integer cells as (num_cells, dim)
+    :type cells: np.ndarray
+    :return: The keys as a 1D array of shape (num_cells,)
+    :rtype: np.ndarray
+    """
+    cells = np.ascontiguousarray(cells, dtype=np.int64)
+    if cells.shape[0] == 0 or cells.shape[1] == 0:
+        return np.zeros(cells.shape[0], dtype=np.int64)
+    low, high = cells.min(axis=0), cells.max(axis=0)
+    # The spans are checked in floating point, as they can overflow int64 for far apart coordinates
+    if np.sum(np.log2(high.astype(np.float64) - low.astype(np.float64) + 1)) < 63:
+        spans = high - low + 1
+        keys = np.zeros(cells.shape[0], dtype=np.int64)
+        for dim in range(cells.shape[1]):
+            keys = keys * spans[dim] + (cells[:, dim] - low[dim])
+        return keys
+    return cells.view(np.dtype((np.void, cells.dtype.itemsize * cells.shape[1]))).ravel()
+
+
+@profiled()
+def cumulative_coverage(observations: np.ndarray, cell_size: float = 1.0) -> np.ndarray:
+    """
+    For observations, return the cumulative number of distinct cells visited across all envs.
+
+    :param observations: Observations as (num_timesteps, n_envs, obs)
+    :type observations: np.ndarray
+    :param cell_size: Size of a cell, defaults to 1.0
+    :type cell_size: float, optional
+    :return: The number of distinct cells visited up to each timestep
+    :rtype: 1D np.ndarray as (num_timesteps,)
+    """
+    num_timesteps, num_envs = observations.shape[0], observations.shape[1]
+    cells = discretize(observations, cell_size).reshape(num_timesteps * num_envs, observations.shape[2])
+    _, first_idx = np.unique(cell_keys(cells), return_index=True)
+    new_cells = np.bincount(first_idx // num_envs, minlength=num_timesteps)
+    return np.cumsum(new_cells)
+
+
+def _void_keys(cells: np.ndarray) -> np.ndarray:
+    # Unlike the packed keys, these keys do not depend on the range of the cells, so they are comparable across chunks
+    cells = np.ascontiguousarray(cells, dtype=np.int64)
+    return cells.view(np.dtype((np.void, cells.dtype.itemsize * cells.shape[1]))).ravel()
+
+
+class CoverageTracker:
+    """
+    Track the cumulative space coverage of observations received chunk by chunk.
+
+    Only the distinct visited cells are stored, so the memory scales with the number of distinct cells,
+    not with the number of timesteps.
+
+    :param cell_size: Size of a cell, defaults to 1.0
+    :type cell_size: float, optional
+    """
+
+    def __init__(self, cell_size: float = 1.0) -> None:
+        self.cell_size = cell_size
+        self.num_timesteps = 0
+        self._seen = None  # Sorted keys of the visited cells
+
+    @property
+    def num_cells(self) -> int:
+        """Number of distinct cells visited so far."""
+        return 0 if self._seen is None else self._seen.shape[0]
+
+    @profiled()
+    def update(self, observations: np.ndarray) -> np.ndarray:
+        """
+        Update the tracker with a chunk of observations and return the cumulative coverage.
+
+        :param observations: Observations as (num_timesteps, n_envs, obs)
+        :type observations: np.ndarray
+        :return: The number of distinct cells visited up to each timestep of the chunk
+        :rtype: 1D np.ndarray as (num_timesteps,)
+        """
+        num_timesteps, num_envs = observations.shape[0], observations.shape[1]
+        cells = discretize(observations, self.cell_size).reshape(num_timesteps * num_envs, observations.shape[2])
+        keys, first_idx = np.unique(_void_keys(cells), return_index=True)
+        if self._seen is not None:
+            is_new = np.isin(keys, self._seen, assume_unique=True, invert=True)
+            keys, first_idx = keys[is_new], first_idx[is_new]
+            keys = np.union1d(self._seen, keys)
+        new_cells = np.bincount(first_idx // num_envs, minlength=num_timesteps)
+        counts = self.num_cells + np.cumsum(new_cells)
+        self._seen = keys
+        self.num_timesteps += num_timesteps
+        return counts
+
+    def state_dict(self) -> dict:
+        """
+        Return the state of the tracker, for checkpointing.
+
+        :return: The state, containing the cell size, the number of timesteps and the visited cells
+        :rtype: dict
+        """
+        dim = 0 if self._seen is None else self._seen.dtype.itemsize // 8
+        cells = np.zeros((0, dim), dtype=np.int64) if self._seen is None else self._seen.view(np.int64).reshape(-1, dim)
+        return {"cell_size": self.cell_size, "num_timesteps": self.num_timesteps, "cells": cells.copy()}
+
+    def load_state_dict(self, state_dict: dict) -> None:
+        """
+        Load a state returned by state_dict().
+
+        :param state_dict: The state
+        :type state_dict: dict
+        """
+        self.cell_size = state_dict["cell_size"]
+        self.num_timesteps = state_dict["num_timesteps"]
+        cells = np.asarray(state_dict["cells"], dtype=np.int64)
+        self._seen = np.unique(_void_keys(cells)) if cells.shape[1] > 0 else None
+
+
+class ExplorationStats(NamedTuple):
+    """
+    Visit statistics of observations, as returned by exploration_stats.
+
+    :param cells: The distinct visited cells as (num_cells, dim), sorted by key
+    :param counts: Number of visits of each cell as (num_cells,)
+    :param first_visit: Timestep of the first visit of each cell as (num_cells,)
+    :param coverage: Number of distinct cells visited up to each timestep as (num_timesteps,)
+    :param entropy: Entropy of the distribution of the visits up to each timestep as (num_timesteps,), in nats
+    :param novelty: Count-based novelty of each step as (num_timesteps, n_envs): 1 / sqrt(n), n being the number of
+        visits of the cell so far, this one included
+    """
+
+    cells: np.ndarray
+    counts: np.ndarray
+    first_visit: np.ndarray
+    coverage: np.ndarray
+    entropy: np.ndarray
+    novelty: np.ndarray
+
+
+@profiled()
+def exploration_stats(observations: np.ndarray, cell_size: float = 1.0) -> ExplorationStats:
+    """
+    Compute the visit counts of the cells and the exploration statistics of observations, in one pass.
+
+    :param observations: Observations as (num_timesteps, n_envs, obs)
+    :type observations: np.ndarray
+    :param cell_size: Size of a cell, defaults to 1.0
+    :type cell_size: float, optional
+    :return: The statistics
+    :rtype: ExplorationStats
+    """
+    num_timesteps, num_envs = observations.shape[0], observations.shape[1]
+    cells = discretize(observations, cell_size).reshape(num_timesteps * num_envs, observations.shape[2])
+    _, first_idx, inverse, counts = np.unique(
+        cell_keys(cells), return_index=True, return_inverse=True, return_counts=True
+    )
+    inverse = inverse.reshape(-1)
+
+    # Visit number of every step in its cell. The steps are in time order, so a stable sort groups them by cell
+    # while keeping that order.
+    order = np.argsort(inverse, kind="stable")
+    visits = np.empty(inverse.shape[0], dtype=np.int64)
+    visits[order] = np.arange(inverse.shape[0]) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+    visits = visits.reshape(num_timesteps, num_envs).astype(np.float64)
+
+    # With N visits in total, the entropy is log(N) - sum(c log c) / N, and a visit increases the count of its cell
+    # from n - 1 to n, so sum(c log c) by n log(n) - (n - 1) log(n - 1)
+    increase = visits * np.log(visits) - (visits - 1) * np.log(np.maximum(visits - 1, 1))
+    num_visits = np.arange(1, num_timesteps + 1) * num_envs
+    entropy = np.log(num_visits) - np.cumsum(increase.sum(axis=1)) / num_visits
+
+    first_visit = first_idx // num_envs
+    coverage = np.cumsum(np.bincount(first_visit, minlength=num_timesteps))
+    return ExplorationStats(cells[first_idx], counts, first_visit, coverage, entropy, 1 / np.sqrt(visits))
+
+
+def _exploration_stats(observations: Union[np.ndarray, str], cell_size: float) -> ExplorationStats:
+    if isinstance(observations, str):
+        observations = np.load(observations, mmap_mode="r")
+    return exploration_stats(observations, cell_size)
+
+
+@profiled()
+def exploration_stats_runs(
+    observations: Sequence[Union[np.ndarray, str]], cell_size: float = 1.0, n_workers: Optional[int] = None
+) -> List[ExplorationStats]:
+    """
+    Compute the exploration statistics of several runs, such as several seeds, across a pool of processes.
+
+    :param observations: The observations of every run, each as (num_timesteps, n_envs, obs), or as the path of
+        a .npy file holding them, loaded in the worker to avoid sending the observations to it
+    :type observations: Sequence[Union[np.ndarray, str]]
+    :param cell_size: Size of a cell, defaults to 1.0
+    :type cell_size: float, optional
+    :param n_workers: Number of worker processes, defaults to None (number of processors)
+    :type n_workers: Optional[int], optional
+    :return: The statistics of every run
+    :rtype: List[ExplorationStats]
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        return list(executor.map(_exploration_stats, observations, [cell_size] * len(observations)))
+
+
+def exploration_curves(stats: Sequence[ExplorationStats], metric: str = "coverage") -> np.ndarray:
+    """
+    Stack a per-timestep statistic of several runs, to aggregate it with save_iqm or save_median.
+
+    :param stats: The statistics of every run, as returned by exploration_stats_runs
+    :type stats: Sequence[ExplorationStats]
+    :param metric: "coverage", "entropy" or "novelty" (averaged over the envs), defaults to "coverage"
+    :type metric: str, optional
+    :return: The values as a matrix of shape (num_runs x num_timesteps), the runs being truncated to the
+        shortest one
+    :rtype: np.ndarray
+    """
+    if metric not in ("coverage", "entropy", "novelty"):
+        raise ValueError(f"Unknown metric {metric}, must be 'coverage', 'entropy' or 'novelty'")
+    curves = [getattr(run_stats, metric) for run_stats in stats]
+    curves = [curve.mean(axis=1) if curve.ndim == 2 else curve for curve in curves]
+    length = min(len(curve) for curve in curves)
+    return np.stack([curve[:length] for curve in curves])
@@ -0,0 +1,275 @@
+import os
+import re
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from toolbox.profiling import profiled
+
+# Rows formatted and written at once
+BLOCK_SIZE = 2**16
+
+_SPEC = re.compile(r"%(?:\.(\d+))?([df])")
+
+
+def _parse_fmt(fmt: str, num_columns: int) -> Optional[Tuple[List[str], List[Tuple[str, int]]]]:
+    # Split a row format into the literal texts around the specs and the (conversion, precision) of every spec.
+    # None if the format has specs other than %d and %.<precision>f, which are formatted by Python.
+    matches = list(_SPEC.finditer(fmt))
+    if len(matches) != num_columns:
+        return None
+    literals, specs, position = [], [], 0
+    for match in matches:
+        literals.append(fmt[position : match.start()])
+        precision, conversion = match.group(1), match.group(2)
+        if conversion == "d" and precision is not None:
+            return None
+        precision = 6 if precision is None else int(precision)
+        if precision > 15:  # 10**precision must be exact, and the scaled values below 2**52
+            return None
+        specs.append((conversion, precision))
+        position = match.end()
+    literals.append(fmt[position:])
+    if any("%" in literal or "\0" in literal for literal in literals):
+        return None
+    return literals, specs
+
+
+def _digits(integers: np.ndarray, num_digits: np.ndarray, negative: np.ndarray, width: int) -> np.ndarray:
+    # Right-aligned characters of the integers with their sign, as (n, width) bytes, padded with NUL
+    chars = np.zeros((len(integers), width), dtype=np.uint8)
+    remainder = integers
+    for j in range(width):  # From the right
+        column = width - 1 - j
+        remainder, digit = np.divmod(remainder, 10)
+        chars[:, column] = np.where(j < num_digits, 48 + digit, 0)
+        chars[negative & (j == num_digits), column] = ord("-")
+    return chars
+
+
+def _format_column(values: np.ndarray, conversion: str, precision: int, spec: str) -> np.ndarray:
+    # Characters of the formatted values, as (n, width) bytes, right-aligned and padded with NUL
+    if conversion == "d":
+        python = ~(np.abs(values) < 2.0**63)  # Not finite, or not a valid int64
+        truncated = np.trunc(np.where(python, 0, values))
+        negative = truncated < 0
+        integers, fractions = np.abs(truncated).astype(np.int64), None
+    else:
+        # Python rounds the exact value of the float, to the nearest with ties to even. The rounding of the
+        # scaled value agrees with it, except maybe within an ulp of a tie: these values are formatted by Python.
+        with np.errstate(over="ignore", invalid="ignore"):  # Not finite values are formatted by Python too
+            scaled = values * 10.0**precision
+            distance_to_tie = np.abs(np.abs(scaled - np.floor(scaled)) - 0.5)
+            python = ~(np.abs(scaled) < 2.0**52) | (distance_to_tie <= 2 * np.abs(np.spacing(scaled)))
+        rounded = np.abs(np.rint(np.where(python, 0, scaled))).astype(np.int64)
+        negative = np.signbit(values) & ~python  # Python writes "-0.000" for small negative values
+        integers, fractions = np.divmod(rounded, 10**precision)
+
+    num_digits = 1 + np.searchsorted(10 ** np.arange(1, 19, dtype=np.int64), integers, side="right")
+    width = int(np.max(num_digits + negative, initial=1))
+    parts = [_digits(integers, num_digits, negative, width)]
+    if fractions is not None and precision > 0:
+        parts.append(np.full((len(values), 1), ord("."), dtype=np.uint8))
+        parts.append(_digits(fractions, np.full(len(values), precision), np.zeros(len(values), dtype=bool), precision))
+    chars = np.concatenate(parts, axis=1)
+
+    if python.any():
+        strings = [spec % value for value in values[python].tolist()]
+        width = max(chars.shape[1], max(len(string) for string in strings))
+        chars = np.concatenate((np.zeros((len(values), width - chars.shape[1]), dtype=np.uint8), chars), axis=1)
+        padded = "".join(string.rjust(width, "\0") for string in strings).encode("latin1")
+        chars[python] = np.frombuffer(padded, dtype=np.uint8).reshape(-1, width)
+    return chars
+
+
+def format_rows(out: np.ndarray, fmt: str) -> str:
+    """
+    Format the rows of a matrix, exactly as np.savetxt does.
+
+    With %d and %.<precision>f specs and float values, the whole matrix is formatted with array operations.
+    Otherwise, each row is formatted by Python, but all the rows at once.
+
+    :param out: The matrix, of shape (num_rows x num_columns)
+    :type out: np.ndarray
+    :param fmt: The format of a row, with one spec per column, such as "%d %.3f"
+    :type fmt: str
+    :return: The rows, each followed by a newline
+    :rtype: str
+    """
+    out = np.asarray(out)
+    num_rows, num_columns = out.shape
+    parsed = _parse_fmt(fmt, num_columns) if out.dtype.kind == "f" else None
+    if parsed is None or num_rows == 0:
+        return ((fmt + "\n") * num_rows) % tuple(out.ravel().tolist())
+
+    literals, specs = parsed
+    out = out.astype(np.float64, copy=False)
+    parts = []
+    for i, (conversion, precision) in enumerate(specs):
+        if literals[i]:
+            parts.append(
+                np.broadcast_to(np.frombuffer(literals[i].encode("latin1"), np.uint8), (num_rows, len(literals[i])))
+            )
+        spec = "%d" if conversion == "d" else f"%.{precision}f"
+        parts.append(_format_column(out[:, i], conversion, precision, spec))
+    end = (literals[-1] + "\n").encode("latin1")
+    parts.append(np.broadcast_to(np.frombuffer(end, np.uint8), (num_rows, len(end))))
+    chars = np.concatenate(parts, axis=1)
+    return chars[chars != 0].tobytes().decode("latin1")
+
+
+def sidecar_filename(filename: str) -> str:
+    """
+    Return the filename of the binary sidecar of a .dat file.
+
+    :param filename: The .dat filename
+    :type filename: str
+    :rtype: str
+    """
+    return filename + ".npy"
+
+
+def _num_rows(filename: str) -> int:
+    # The number of rows of a .dat file, without the header, counted by blocks without parsing them
+    with open(filename, "rb") as f:
+        first_line = f.readline()
+        num_lines = first_line.count(b"\n")
+        for block in iter(lambda: f.read(2**22), b""):
+            num_lines += block.count(b"\n")
+    try:
+        np.array(first_line.split(), dtype=np.float64)
+    except ValueError:
+        return num_lines - 1
+    return num_lines
+
+
+def _sidecar_is_current(filename: str) -> bool:
+    # A sidecar written with the .dat file gets the modification time of the .dat file (see _mark_current), which
+    # changes when the .dat file is written without it. With coarse timestamps, the .dat file can be written again
+    # within the same tick, so the number of rows must also match.
+    try:
+        with open(sidecar_filename(filename), "rb") as f:
+            if os.stat(f.fileno()).st_mtime_ns != os.stat(filename).st_mtime_ns:
+                return False
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape = np.lib.format.read_array_header_1_0(f)[0]
+            elif version == (2, 0):
+                shape = np.lib.format.read_array_header_2_0(f)[0]
+            else:
+                return False
+        return shape[0] == _num_rows(filename)
+    except (FileNotFoundError, ValueError):
+        return False
+
+
+def _mark_current(filename: str) -> None:
+    # Comparing the exact times does not depend on the order or the resolution of the file system timestamps
+    stat = os.stat(filename)
+    os.utime(sidecar_filename(filename), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+
+def _records(out: np.ndarray, header: str) -> np.ndarray:
+    # The rows as a structured array with one float64 field per column, named after the header when possible
+    names = header.split()
+    if len(names) != out.shape[1] or len(set(names)) != len(names):
+        names = [f"f{i}" for i in range(out.shape[1])]
+    dtype = np.dtype([(name, np.float64) for name in names])
+    return np.ascontiguousarray(out, dtype=np.float64).view(dtype).reshape(-1)
+
+
+def _append_records(path: str, records: np.ndarray) -> None:
+    # Append to a .npy file in place. numpy leaves room in the header for the length to grow, so only the length
+    # in the header is rewritten. Otherwise, the whole file is rewritten.
+    import io
+
+    with open(path, "r+b") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        elif version == (2, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        else:
+            shape, fortran_order, dtype = None, None, None
+        if dtype != records.dtype or len(shape) != 1:
+            raise ValueError(f"Cannot append to {path}: the columns differ from the ones of the file")
+        data_offset = f.tell()
+        header = io.BytesIO()
+        write_header = (
+            np.lib.format.write_array_header_1_0 if version == (1, 0) else np.lib.format.write_array_header_2_0
+        )
+        header_data = {
+            "descr": np.lib.format.dtype_to_descr(dtype),
+            "fortran_order": False,
+            "shape": (shape[0] + len(records),),
+        }
+        write_header(header, header_data)
+        if header.tell() == data_offset:
+            f.seek(0, os.SEEK_END)
+            f.write(records.tobytes())
+            f.seek(0)
+            f.write(header.getvalue())
+            return
+    np.save(path, np.concatenate((np.load(path), records)))
+
+
+@profiled()
+def write_dat(
+    filename: str, out: np.ndarray, fmt: str, header: str, append: bool = False, sidecar: bool = False
+) -> None:
+    """
+    Write a matrix as a .dat file, byte for byte as np.savetxt(filename, out, fmt=fmt, header=header, comments="").
+
+    The rows are formatted by blocks of BLOCK_SIZE rows, with array operations (see format_rows), and written with
+    large buffered writes.
+
+    :param filename: The filename
+    :type filename: str
+    :param out: The matrix, of shape (num_rows x num_columns)
+    :type out: np.ndarray
+    :param fmt: The format of a row, with one spec per column, such as "%d %.3f"
+    :type fmt: str
+    :param header: The header, such as "timestep iqm"
+    :type header: str
+    :param append: If the file exists, append the rows to it, without the header, defaults to False
+    :type append: bool, optional
+    :param sidecar: Also write the rows in full precision to a binary sidecar, filename + ".npy": a structured
+        array with one float64 field per column, named after the header, see load_dat. When appending, the rows are
+        only appended to an existing sidecar up to date with the file, defaults to False
+    :type sidecar: bool, optional
+    """
+    append = append and os.path.exists(filename)
+    sidecar_is_current = append and _sidecar_is_current(filename)
+    with open(filename, "a" if append else "w", encoding="latin1", buffering=2**20) as f:
+        if not append and len(header) > 0:
+            f.write(header + "\n")
+        for start in range(0, len(out), BLOCK_SIZE):
+            f.write(format_rows(out[start : start + BLOCK_SIZE], fmt))
+    if sidecar:
+        records = _records(np.reshape(out, (len(out), -1)), header)
+        if not append:
+            np.save(sidecar_filename(filename), records)
+        elif sidecar_is_current:
+            _append_records(sidecar_filename(filename), records)
+        else:
+            return
+        _mark_current(filename)
+
+
+def load_dat(filename: str, mmap: bool = True) -> np.ndarray:
+    """
+    Load a .dat file, as a structured array with one field per column, named after the header.
+
+    When the file has a binary sidecar up to date with it (see write_dat), the values are read from the sidecar, in
+    full precision and memory-mapped. Otherwise, the text is parsed.
+
+    :param filename: The .dat filename
+    :type filename: str
+    :param mmap: Whether to memory-map the sidecar, defaults to True
+    :type mmap: bool, optional
+    :return: The rows
+    :rtype: np.ndarray
+    """
+    if _sidecar_is_current(filename):
+        return np.load(sidecar_filename(filename), mmap_mode="r" if mmap else None)
+    return np.genfromtxt(filename, names=True, deletechars="", dtype=np.float64, ndmin=1)
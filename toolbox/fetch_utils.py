@@ -1,37 +1,199 @@
+from typing import Dict, Iterable, List, Optional, Union
+
 import gym
 import numpy as np
 
+from toolbox.coverage import cumulative_coverage
+
+
+class SiteBuffer:
+    """
+    Preallocated buffer storing the xyz positions of sim sites, one entry per step.
+
+    The buffer doubles its capacity when full. If max_len is set, it stops growing at max_len and
+    then behaves as a ring buffer, overwriting the oldest entries.
+
+    :param num_sites: Number of sites recorded at each step
+    :type num_sites: int
+    :param capacity: Initial capacity, defaults to 1024
+    :type capacity: int, optional
+    :param max_len: Maximum number of entries kept, defaults to None (unbounded)
+    :type max_len: Optional[int], optional
+    :param n_envs: If set, each entry holds the sites of n_envs envs, as (n_envs, num_sites, 3), defaults to None
+        (entries as (num_sites, 3))
+    :type n_envs: Optional[int], optional
+    """
+
+    def __init__(
+        self, num_sites: int, capacity: int = 1024, max_len: Optional[int] = None, n_envs: Optional[int] = None
+    ) -> None:
+        capacity = capacity if max_len is None else min(capacity, max_len)
+        self.max_len = max_len
+        entry_shape = (num_sites, 3) if n_envs is None else (n_envs, num_sites, 3)
+        self._data = np.empty((capacity, *entry_shape))
+        self._len = 0
+        self._start = 0  # Index of the oldest entry, non-zero only once the ring has wrapped
+
+    def __len__(self) -> int:
+        return self._len
+
+    def append(self, positions: Union[np.ndarray, List[np.ndarray]]) -> None:
+        """
+        Append the positions of the sites for one step.
 
-def highest_so_far(infos):
-    n_envs = infos[0].shape[0]
-    object_z = np.array([[info[env_idx]["object_z"] for env_idx in range(n_envs)] for info in infos])
+        :param positions: Positions as (num_sites, 3), or (n_envs, num_sites, 3) if n_envs is set
+        :type positions: Union[np.ndarray, List[np.ndarray]]
+        """
+        capacity = self._data.shape[0]
+        if self._len == capacity and (self.max_len is None or capacity < self.max_len):
+            new_capacity = 2 * capacity if self.max_len is None else min(2 * capacity, self.max_len)
+            data = np.empty((new_capacity, *self._data.shape[1:]))
+            data[:capacity] = self._data
+            self._data = data
+            capacity = new_capacity
+        if self._len < capacity:
+            self._data[self._len] = positions
+            self._len += 1
+        else:
+            self._data[self._start] = positions
+            self._start = (self._start + 1) % capacity
+
+    @property
+    def data(self) -> np.ndarray:
+        """
+        The stored positions as (num_steps, num_sites, 3), or (num_steps, n_envs, num_sites, 3) if n_envs is set,
+        oldest first.
+
+        This is a view on the buffer (no copy), except once a ring buffer has wrapped, where the
+        entries have to be reordered.
+        """
+        if self._start == 0:
+            return self._data[: self._len]
+        return np.concatenate((self._data[self._start :], self._data[: self._start]))
+
+    def clear(self) -> None:
+        """Remove all the entries, keeping the allocated memory."""
+        self._len = 0
+        self._start = 0
+
+
+def highest_so_far(infos: Union[np.ndarray, List[np.ndarray]], site: int = 0) -> np.ndarray:
+    """
+    Return the highest object z reached so far, across all envs.
+
+    :param infos: Either the site positions of all the envs as (num_timesteps, n_envs, num_sites, 3), as
+        recorded by VecSiteRecorder, or the list of infos returned by the vectorized env
+    :type infos: Union[np.ndarray, List[np.ndarray]]
+    :param site: Index of the object site among the recorded sites, when the positions are given, defaults to 0
+    :type site: int, optional
+    :return: The highest z reached up to each timestep
+    :rtype: 1D np.ndarray as (num_timesteps,)
+    """
+    if isinstance(infos, np.ndarray) and infos.dtype != object:
+        if infos.ndim != 4 or infos.shape[3] != 3:
+            raise ValueError(
+                f"The positions must be given as (num_timesteps, n_envs, num_sites, 3), got shape {infos.shape}"
+            )
+        object_z = infos[:, :, site, 2]
+    else:
+        n_envs = infos[0].shape[0]
+        object_z = np.array([[info[env_idx]["object_z"] for env_idx in range(n_envs)] for info in infos])
     highest = np.maximum.accumulate(object_z, 0).max(1)
     return highest
 
 
 class FetchWrapper(gym.Wrapper):
+    """
+    Record the position of sim sites at every step.
+
+    The positions are written into a SiteBuffer, exposed without copy by `site_positions`, and returned in
+    info["site_positions"] as (num_sites, 3). With a vectorized env, the buffer lives in the env, possibly in a
+    worker process: record the positions of all the envs with VecSiteRecorder instead.
+
+    :param env: The Fetch environment
+    :type env: gym.Env
+    :param sites: The names of the sites to record, defaults to ("object0",)
+    :type sites: Iterable[str], optional
+    :param capacity: Initial capacity of the buffer, defaults to 1024
+    :type capacity: int, optional
+    :param max_len: Maximum number of steps kept, defaults to None (unbounded)
+    :type max_len: Optional[int], optional
+    """
+
+    def __init__(
+        self, env: gym.Env, sites: Iterable[str] = ("object0",), capacity: int = 1024, max_len: Optional[int] = None
+    ) -> None:
+        super().__init__(env)
+        self.sites = list(sites)
+        self.site_buffer = SiteBuffer(len(self.sites), capacity, max_len)
+
+    @property
+    def site_positions(self) -> np.ndarray:
+        """The recorded positions as (num_steps, num_sites, 3)."""
+        return self.site_buffer.data
+
     def step(self, action):
         obs, reward, done, info = super().step(action)
-        object_pos = self.env.sim.data.get_site_xpos("object0")
-        info["object_z"] = object_pos[2]
+        positions = [self.env.sim.data.get_site_xpos(site) for site in self.sites]
+        self.site_buffer.append(positions)
+        info["site_positions"] = np.array(positions)
+        if "object0" in self.sites:
+            info["object_z"] = positions[self.sites.index("object0")][2]
         return obs, reward, done, info
 
 
+class VecSiteRecorder:
+    """
+    Record the site positions of all the envs of a vectorized env, in the main process.
+
+    Each env must be wrapped in a FetchWrapper, which returns the positions of its sites in info["site_positions"].
+    The infos of a vectorized env are returned to the main process, even with SubprocVecEnv, so the positions are
+    stacked into a single SiteBuffer, without gathering the buffers of the envs. Call record with the infos of each
+    step, for example from a callback.
+
+    :param n_envs: Number of envs
+    :type n_envs: int
+    :param num_sites: Number of sites recorded by the FetchWrapper of each env, defaults to 1
+    :type num_sites: int, optional
+    :param capacity: Initial capacity of the buffer, defaults to 1024
+    :type capacity: int, optional
+    :param max_len: Maximum number of steps kept, defaults to None (unbounded)
+    :type max_len: Optional[int], optional
+    """
+
+    def __init__(self, n_envs: int, num_sites: int = 1, capacity: int = 1024, max_len: Optional[int] = None) -> None:
+        self.site_buffer = SiteBuffer(num_sites, capacity, max_len, n_envs=n_envs)
+
+    def record(self, infos: List[Dict]) -> None:
+        """
+        Record the positions of one step of the vectorized env.
+
+        :param infos: The infos returned by the step of the vectorized env, one per env
+        :type infos: List[Dict]
+        """
+        self.site_buffer.append([info["site_positions"] for info in infos])
+
+    @property
+    def site_positions(self) -> np.ndarray:
+        """The recorded positions as (num_steps, n_envs, num_sites, 3)."""
+        return self.site_buffer.data
+
+
 def cumulative_object_coverage(observations):
     object_pos = observations[:, :, 8:11]
-    num_timesteps, num_envs = observations.shape[0], observations.shape[1]
-    cells = np.floor(object_pos * 10)  # NUM_TIMESTEPS  x NUM_ENV x 3
-    seen_cells = []
-    counts = np.zeros(num_timesteps)
-    for t in range(num_timesteps):
-        for env_idx in range(num_envs):
-            is_new = True
-            cell = cells[t, env_idx]
-            for seen_cell in seen_cells:
-                if (seen_cell == cell).all():
-                    is_new = False
-                    break
-            if is_new:
-                seen_cells.append(cell)
-        counts[t] = len(seen_cells)
-    return counts
+    return cumulative_site_coverage(object_pos)
+
+
+def cumulative_site_coverage(site_pos: np.ndarray, cell_size: float = 0.1) -> np.ndarray:
+    """
+    Return the cumulative space coverage of a site.
+
+    :param site_pos: Site positions as (num_timesteps, n_envs, 3), for example the positions of a site recorded
+        by VecSiteRecorder, recorder.site_positions[:, :, site]
+    :type site_pos: np.ndarray
+    :param cell_size: Size of a cell, defaults to 0.1
+    :type cell_size: float, optional
+    :return: The number of distinct cells visited up to each timestep
+    :rtype: 1D np.ndarray as (num_timesteps,)
+    """
+    return cumulative_coverage(site_pos, cell_size).astype(np.float64)
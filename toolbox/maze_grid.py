@@ -1,5 +1,7 @@
 import numpy as np
 
+from toolbox.coverage import cumulative_coverage
+
 
 def compute_coverage(observations: np.ndarray) -> np.ndarray:
     """
@@ -9,15 +11,6 @@ def compute_coverage(observations: np.ndarray) -> np.ndarray:
     :type observations: np.ndarray
     :rtype: 1D np.ndarray as (num_timesteps,)
     """
-    cells = np.floor(observations)
-    seen_cells = []
-    counts = np.zeros(observations.shape[0])
-    for t, cell in enumerate(cells):
-        is_new = True
-        for seen_cell in seen_cells:
-            if (seen_cell == cell).all():
-                is_new = False
-        if is_new:
-            seen_cells.append(cell)
-        counts[t] = len(seen_cells)
-    return counts
+    # The cell is the joint cell of all envs at a given timestep
+    observations = observations.reshape(observations.shape[0], 1, np.prod(observations.shape[1:], dtype=int))
+    return cumulative_coverage(observations).astype(np.float64)
@@ -0,0 +1,253 @@
+import atexit
+import functools
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional
+
+# Profiling is off unless the TOOLBOX_PROFILE environment variable is set, or inside record(). When it is off, a
+# profiled function only pays a global lookup, and a stage returns a shared null context.
+ENV_VAR = "TOOLBOX_PROFILE"
+# Set by the process that turned profiling on from ENV_VAR, and inherited by the processes it starts
+_OWNER_ENV_VAR = "TOOLBOX_PROFILE_OWNER"
+
+
+class Event(NamedTuple):
+    name: str
+    start: float  # In seconds, from time.perf_counter
+    duration: float  # In seconds
+    self_duration: float  # In seconds, without the nested events
+    size: Optional[int]
+    pid: int
+    tid: int
+
+
+class Profiler:
+    """
+    Collect the timed calls of the profiled functions and stages.
+
+    Each process records its own calls: the work done in worker processes, for instance by save_iqms, only shows as
+    the time spent waiting for them. With TOOLBOX_PROFILE, the processes started by the profiled one inherit the
+    variable, but only report at exit when the trace filename contains {pid}, each one then dumping its own trace.
+    """
+
+    def __init__(self) -> None:
+        self.events: List[Event] = []
+        self._local = threading.local()
+
+    def _enter(self) -> float:
+        # Each open call keeps the total duration of its nested calls, to compute its self duration
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        return time.perf_counter()
+
+    def _exit(self, name: str, start: float, size: Optional[int]) -> None:
+        duration = time.perf_counter() - start
+        stack = self._local.stack
+        nested = stack.pop()
+        if stack:
+            stack[-1] += duration
+        self.events.append(Event(name, start, duration, duration - nested, size, os.getpid(), threading.get_ident()))
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Aggregate the events by name.
+
+        :return: For each name, the number of calls, the total, self and maximum time in seconds, and the total size
+        :rtype: Dict[str, Dict[str, float]]
+        """
+        stats = {}
+        for event in self.events:
+            entry = stats.setdefault(
+                event.name, {"calls": 0, "time": 0.0, "self_time": 0.0, "max_time": 0.0, "size": 0}
+            )
+            entry["calls"] += 1
+            entry["time"] += event.duration
+            entry["self_time"] += event.self_duration
+            entry["max_time"] = max(entry["max_time"], event.duration)
+            entry["size"] += event.size if event.size is not None else 0
+        return stats
+
+    def summary(self) -> str:
+        """
+        Return a table of the stats, sorted by decreasing self time.
+
+        :rtype: str
+        """
+        stats = sorted(self.stats().items(), key=lambda item: item[1]["self_time"], reverse=True)
+        total_self_time = sum(entry["self_time"] for _, entry in stats)
+        width = max([len("name")] + [len(name) for name, _ in stats])
+        lines = [
+            f"{'name':<{width}} {'calls':>8} {'total ms':>11} {'self ms':>11} {'self %':>7} {'max ms':>10} "
+            f"{'size':>12} {'size/s':>10}"
+        ]
+        for name, entry in stats:
+            share = 100 * entry["self_time"] / total_self_time if total_self_time > 0 else 0.0
+            throughput = f"{entry['size'] / entry['time']:.3g}" if entry["size"] and entry["time"] > 0 else "-"
+            lines.append(
+                f"{name:<{width}} {entry['calls']:>8} {entry['time'] * 1e3:>11.2f} {entry['self_time'] * 1e3:>11.2f} "
+                f"{share:>6.1f}% {entry['max_time'] * 1e3:>10.2f} {entry['size'] or '-':>12} {throughput:>10}"
+            )
+        return "\n".join(lines)
+
+    def dump(self, filename: str) -> None:
+        """
+        Dump the events in the Chrome trace format, readable by chrome://tracing and Perfetto. The file also holds
+        the stats, under the "summary" key.
+
+        :param filename: The output filename
+        :type filename: str
+        """
+        import json
+
+        trace_events = []
+        for event in self.events:
+            trace_event = {
+                "name": event.name,
+                "ph": "X",
+                "ts": event.start * 1e6,
+                "dur": event.duration * 1e6,
+                "pid": event.pid,
+                "tid": event.tid,
+            }
+            if event.size is not None:
+                trace_event["args"] = {"size": event.size}
+            trace_events.append(trace_event)
+        with open(filename, "w") as f:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms", "summary": self.stats()}, f)
+
+    def clear(self) -> None:
+        """Remove all the events."""
+        self.events.clear()
+
+
+# The active profiler, None when profiling is off
+_profiler: Optional[Profiler] = None
+
+
+def active_profiler() -> Optional[Profiler]:
+    """
+    Return the active profiler, None when profiling is off.
+
+    :rtype: Optional[Profiler]
+    """
+    return _profiler
+
+
+@contextmanager
+def record(profiler: Optional[Profiler] = None) -> Iterator[Profiler]:
+    """
+    Profile the calls made inside the context.
+
+    :param profiler: The profiler collecting the calls, defaults to None (a new one)
+    :type profiler: Optional[Profiler], optional
+    :return: The profiler
+    :rtype: Iterator[Profiler]
+    """
+    global _profiler
+    previous = _profiler
+    _profiler = profiler if profiler is not None else Profiler()
+    try:
+        yield _profiler
+    finally:
+        _profiler = previous
+
+
+def _default_size(args: tuple) -> Optional[int]:
+    # Size of the first array argument, or length of the first sequence argument
+    for arg in args:
+        size = getattr(arg, "size", None)
+        if isinstance(size, int):
+            return size
+        if isinstance(arg, (list, tuple)):
+            return len(arg)
+    return None
+
+
+def profiled(name: Optional[str] = None, size: Optional[Callable[..., Optional[int]]] = None) -> Callable:
+    """
+    Decorate a function so that its calls are recorded when profiling is on.
+
+    :param name: The name of the calls, defaults to None (module and qualified name of the function)
+    :type name: Optional[str], optional
+    :param size: Function of the arguments returning the size of the input, defaults to None (size of the first
+        array argument, or length of the first sequence argument)
+    :type size: Optional[Callable[..., Optional[int]]], optional
+    """
+
+    def decorator(func: Callable) -> Callable:
+        event_name = name if name is not None else f"{func.__module__.rsplit('.', 1)[-1]}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            profiler = _profiler
+            if profiler is None:
+                return func(*args, **kwargs)
+            input_size = size(*args, **kwargs) if size is not None else _default_size(args)
+            start = profiler._enter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler._exit(event_name, start, input_size)
+
+        return wrapper
+
+    return decorator
+
+
+class _Stage:
+    def __init__(self, profiler: Profiler, name: str, size: Optional[int]) -> None:
+        self.profiler, self.name, self.size = profiler, name, size
+
+    def __enter__(self) -> None:
+        self.start = self.profiler._enter()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.profiler._exit(self.name, self.start, self.size)
+
+
+_NULL_STAGE = nullcontext()
+
+
+def stage(name: str, size: Optional[int] = None):
+    """
+    Return a context manager recording the code it wraps as a stage, when profiling is on.
+
+    :param name: The name of the stage
+    :type name: str
+    :param size: The size of the input of the stage, defaults to None
+    :type size: Optional[int], optional
+    """
+    profiler = _profiler
+    if profiler is None:
+        return _NULL_STAGE
+    return _Stage(profiler, name, size)
+
+
+def _report(profiler: Profiler, target: str) -> None:
+    if not profiler.events:
+        return
+    if target.lower() in ("1", "true", "yes"):
+        print(profiler.summary(), file=sys.stderr)
+    else:
+        profiler.dump(target.format(pid=os.getpid()))
+
+
+def _from_environment() -> None:
+    # TOOLBOX_PROFILE=1 prints the summary at exit, TOOLBOX_PROFILE=trace.json dumps the trace at exit. The filename
+    # can contain {pid}, replaced by the process id. The processes started by the profiled one, such as the workers
+    # of a process pool, would print their own summary or overwrite the same trace, so they are only profiled when
+    # each one dumps its own trace.
+    global _profiler
+    target = os.environ.get(ENV_VAR, "")
+    if target.lower() in ("", "0", "false", "no"):
+        return
+    if os.environ.setdefault(_OWNER_ENV_VAR, str(os.getpid())) != str(os.getpid()) and "{pid}" not in target:
+        return
+    _profiler = Profiler()
+    atexit.register(_report, _profiler, target)
+
+
+_from_environment()
@@ -1,25 +1,55 @@
+from functools import lru_cache
 from math import atan2, cos, sin
-from typing import List, Optional, Tuple
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional, Tuple, Union
 
 import numpy as np
-import pygame
-from PIL import Image
-from pygame import Color, Surface, gfxdraw
+
+from toolbox.profiling import profiled, stage
+
+# pygame and PIL are imported where they are used, as importing pygame alone takes a large share of the startup
+# time of short-lived processes that never render
+if TYPE_CHECKING:
+    import pygame
+    from pygame import Surface
+
+# A color, as an RGB or RGBA tuple, or a pygame.Color
+_ColorLike = Union[Tuple[int, ...], "pygame.Color"]
 
 SCREEN_DIM = 500
 BOUND = 13
 SCALE = SCREEN_DIM / (BOUND * 2)
 OFFSET = SCREEN_DIM // 2
 
-BLACK = Color(0, 0, 0)
-WHITE = Color(255, 255, 255)
-GRAY = Color(192, 192, 192)
-GREEN = Color(0, 200, 0)
-RED = Color(255, 0, 0)
-BLUE = Color(0, 0, 255)
+# The colors, as RGB tuples. The public Color and BLACK, WHITE... are the pygame.Color class and objects, created
+# on first access (see __getattr__)
+_BLACK = (0, 0, 0)
+_WHITE = (255, 255, 255)
+_GRAY = (192, 192, 192)
+_GREEN = (0, 200, 0)
+_RED = (255, 0, 0)
+_BLUE = (0, 0, 255)
+_COLORS = {"BLACK": _BLACK, "WHITE": _WHITE, "GRAY": _GRAY, "GREEN": _GREEN, "RED": _RED, "BLUE": _BLUE}
+
+
+def __getattr__(name):
+    if name != "Color" and name not in _COLORS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import pygame
+
+    value = pygame.Color if name == "Color" else pygame.Color(*_COLORS[name])
+    globals()[name] = value  # Later accesses do not go through __getattr__
+    return value
 
 
-def draw_filled_circle(surf: Surface, pos: np.ndarray, radius: int = 1, color: Color = RED):
+def __dir__():
+    return sorted(set(globals()) | {"Color"} | set(_COLORS))
+
+
+# Colormap of the heatmaps, from the least to the most visited pixels
+HEAT = np.array(((96, 0, 0), (255, 0, 0), (255, 160, 0), (255, 255, 0), (255, 255, 255)), dtype=np.float64)
+
+
+def draw_filled_circle(surf: "Surface", pos: np.ndarray, radius: int = 1, color: _ColorLike = _RED):
     """
     Draw a filled circle on the surface
 
@@ -32,11 +62,60 @@ def draw_filled_circle(surf: Surface, pos: np.ndarray, radius: int = 1, color: C
     :param color: Color of the filling, defaults to RED
     :type color: Color, optional
     """
+    from pygame import gfxdraw
+
     x, y = pos * SCALE + OFFSET
     gfxdraw.filled_circle(surf, int(x), int(y), radius, color)
 
 
-def draw_circle(surf: Surface, pos: np.ndarray, radius: int = 3, color: Color = GREEN):
+@lru_cache()
+def _disc_stencil(radius: int) -> np.ndarray:
+    # Offsets of the pixels covered by gfxdraw.filled_circle, found by drawing it once
+    from pygame import Surface, gfxdraw, surfarray
+
+    size = 2 * radius + 1
+    surf = Surface((size, size))
+    surf.fill(_BLACK)
+    gfxdraw.filled_circle(surf, radius, radius, radius, _WHITE)
+    dx, dy = np.nonzero(surfarray.array_red(surf))
+    return np.stack((dx, dy), axis=1) - radius
+
+
+@profiled()
+def draw_filled_circles(surf: "Surface", positions: np.ndarray, radius: int = 1, color: _ColorLike = _RED):
+    """
+    Draw filled circles on the surface, all at once.
+
+    Same result as calling draw_filled_circle for every position, but the positions are transformed and
+    rasterized with array operations. The cost is the one of a few full-frame boolean operations,
+    almost independent of the number of positions.
+
+    :param surf: The surface
+    :type surf: Surface
+    :param positions: Positions of the circles as an array of shape (num_pos x 2)
+    :type positions: np.ndarray
+    :param radius: Radius of the circles, defaults to 1
+    :type radius: int, optional
+    :param color: Color of the filling, must be opaque, defaults to RED
+    :type color: Color, optional
+    """
+    import pygame
+
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+    width, height = surf.get_size()
+    x, y = (positions * SCALE + OFFSET).astype(np.int64).T  # Truncate toward zero, like int()
+    keep = (x >= -radius) & (x < width + radius) & (y >= -radius) & (y < height + radius)
+    centers = np.zeros((width + 2 * radius, height + 2 * radius), dtype=bool)
+    centers[x[keep] + radius, y[keep] + radius] = True
+    covered = np.zeros((width, height), dtype=bool)
+    for dx, dy in _disc_stencil(radius):
+        covered |= centers[radius - dx : radius - dx + width, radius - dy : radius - dy + height]
+    pixels = pygame.surfarray.pixels3d(surf)
+    pixels[covered] = pygame.Color(color)[:3]
+    del pixels  # Unlock the surface
+
+
+def draw_circle(surf: "Surface", pos: np.ndarray, radius: int = 3, color: _ColorLike = _GREEN):
     """
     Draw a circle on the surface
 
@@ -49,11 +128,15 @@ def draw_circle(surf: Surface, pos: np.ndarray, radius: int = 3, color: Color =
     :param color: Color of the line, defaults to GREEN
     :type color: Color, optional
     """
+    from pygame import gfxdraw
+
     x, y = pos * SCALE + OFFSET
     gfxdraw.circle(surf, int(x), int(y), radius, color)
 
 
-def draw_line(surf: Surface, point_a: np.ndarray, point_b: np.ndarray, thickness: float = 2, color: Color = BLACK):
+def draw_line(
+    surf: "Surface", point_a: np.ndarray, point_b: np.ndarray, thickness: float = 2, color: _ColorLike = _BLACK
+):
     """
     Draw a line on the surface
 
@@ -101,15 +184,17 @@ def draw_line(surf: Surface, point_a: np.ndarray, point_b: np.ndarray, thickness
     # Using the computed coordinates, we draw an unfilled anti-aliased polygon
     # (thanks to @martineau) and then fill it as suggested in the documentation
     # of pygame's gfxdraw module for drawing shapes.
-    pygame.gfxdraw.aapolygon(surf, (UL, UR, BR, BL), color)
-    pygame.gfxdraw.filled_polygon(surf, (UL, UR, BR, BL), color)
+    from pygame import gfxdraw
+
+    gfxdraw.aapolygon(surf, (UL, UR, BR, BL), color)
+    gfxdraw.filled_polygon(surf, (UL, UR, BR, BL), color)
 
 
 def rot(x: np.ndarray, theta: float) -> np.ndarray:
     """
     Return the input point rotated around (0, 0) by a given angle.
 
-    :param x: Input array of shape (2,)
+    :param x: Input array of shape (2,), or (num_points x 2) to rotate several points at once
     :type x: np.ndarray
     :param theta: Angle in degrees
     :type theta: float
@@ -119,16 +204,175 @@ def rot(x: np.ndarray, theta: float) -> np.ndarray:
     r = np.radians(theta)
     c, s = np.cos(r), np.sin(r)
     r = np.array(((c, -s), (s, c)))
-    return np.matmul(r, x)
+    return np.matmul(x, r.T)
+
+
+def _line_quads(points_a: np.ndarray, points_b: np.ndarray, thickness: float) -> np.ndarray:
+    # Same corners as in draw_line, for all the lines at once: returns (num_lines x 4 x 2) pixel coordinates
+    points_a = points_a * SCALE + OFFSET
+    points_b = points_b * SCALE + OFFSET
+    center = (points_a + points_b) / 2.0
+    length = np.linalg.norm(points_a - points_b, axis=1)
+    angle = np.arctan2(points_a[:, 1] - points_b[:, 1], points_a[:, 0] - points_b[:, 0])
+    along = (length / 2.0)[:, None] * np.stack((np.cos(angle), np.sin(angle)), axis=1)
+    across = (thickness / 2.0) * np.stack((-np.sin(angle), np.cos(angle)), axis=1)
+    UL = center + along + across
+    UR = center - along + across
+    BL = center + along - across
+    BR = center - along - across
+    return np.stack((UL, UR, BR, BL), axis=1)
+
+
+@profiled()
+def draw_lines(
+    surf: "Surface", points_a: np.ndarray, points_b: np.ndarray, thickness: float = 2, color: _ColorLike = _BLACK
+):
+    """
+    Draw several lines on the surface. The lines entirely outside the surface are skipped.
+
+    :param surf: The surface
+    :type surf: Surface
+    :param points_a: One point of each line, as an array of shape (num_lines x 2)
+    :type points_a: np.ndarray
+    :param points_b: The other point of each line, as an array of shape (num_lines x 2)
+    :type points_b: np.ndarray
+    :param thickness: Thickness of the lines
+    :type: float
+    :param color: Color of the lines, defaults to BLACK
+    :type color: Color, optional
+    """
+    _draw_quads(surf, _visible_quads(_line_quads(points_a, points_b, thickness), surf.get_size()), color)
+
+
+def _visible_quads(quads: np.ndarray, size: Tuple[int, int]) -> List:
+    # Drop the quads whose bounding box is outside the surface, and return the others as lists for gfxdraw
+    width, height = size
+    low, high = quads.min(axis=1), quads.max(axis=1)
+    visible = (high[:, 0] >= 0) & (low[:, 0] < width) & (high[:, 1] >= 0) & (low[:, 1] < height)
+    return quads[visible].tolist()
+
+
+@profiled()
+def _draw_quads(surf: "Surface", quads: List, color: _ColorLike):
+    from pygame import gfxdraw
+
+    for quad in quads:
+        gfxdraw.aapolygon(surf, quad, color)
+        gfxdraw.filled_polygon(surf, quad, color)
+
+
+@lru_cache(maxsize=16)
+@profiled()
+def _grid_layer(origin: float, width: float, angle: float, bg: Tuple[int, int, int, int]) -> "Surface":
+    # Background with the grid drawn on it. Cached: must be copied before drawing on it.
+    from pygame import Surface
+
+    surf = Surface((SCREEN_DIM, SCREEN_DIM))
+    surf.fill(bg)
+    offsets = (np.arange(400) - 200 + origin) * width
+    ends = np.full(400, 20.0)
+    # Interleave horizontal and vertical lines, to draw them in the same order as one at a time
+    points_a = np.stack((np.stack((-ends, offsets), axis=1), np.stack((offsets, -ends), axis=1)), axis=1)
+    points_b = np.stack((np.stack((ends, offsets), axis=1), np.stack((offsets, ends), axis=1)), axis=1)
+    points_a = rot(points_a.reshape(-1, 2), angle)
+    points_b = rot(points_b.reshape(-1, 2), angle)
+    draw_lines(surf, points_a, points_b, color=_GRAY, thickness=1)
+    return surf
+
+
+@profiled()
+def bin_positions(positions: Union[np.ndarray, Iterable[np.ndarray]]) -> np.ndarray:
+    """
+    Count the positions falling in each pixel.
+
+    :param positions: The positions as an array of shape (num_pos x 2), or an iterable of such arrays, so that the
+        position history never needs to be concatenated
+    :type positions: Union[np.ndarray, Iterable[np.ndarray]]
+    :return: The counts as an array of shape (SCREEN_DIM x SCREEN_DIM), indexed by (x, y) like the surfaces
+    :rtype: np.ndarray
+    """
+    chunks = [positions] if isinstance(positions, np.ndarray) else positions
+    counts = np.zeros(SCREEN_DIM * SCREEN_DIM, dtype=np.int64)
+    for chunk in chunks:
+        chunk = np.asarray(chunk, dtype=np.float64).reshape(-1, 2)
+        x, y = (chunk * SCALE + OFFSET).astype(np.int64).T  # Same pixel as draw_filled_circles
+        keep = (x >= 0) & (x < SCREEN_DIM) & (y >= 0) & (y < SCREEN_DIM)
+        counts += np.bincount(x[keep] * SCREEN_DIM + y[keep], minlength=SCREEN_DIM * SCREEN_DIM)
+    return counts.reshape(SCREEN_DIM, SCREEN_DIM)
+
+
+@profiled()
+def draw_density(surf: "Surface", counts: np.ndarray, log: bool = True, colormap: np.ndarray = HEAT):
+    """
+    Draw the visit counts on the surface as a heatmap. Pixels never visited are left untouched.
+
+    :param surf: The surface
+    :type surf: Surface
+    :param counts: The counts as returned by bin_positions
+    :type counts: np.ndarray
+    :param log: Whether to use a log normalization rather than a linear one, defaults to True
+    :type log: bool, optional
+    :param colormap: The colors, as an array of shape (num_colors x 3), from the least to the most visited,
+        defaults to HEAT
+    :type colormap: np.ndarray, optional
+    """
+    from pygame import surfarray
+
+    visited = counts > 0
+    if not visited.any():
+        return
+    values = counts[visited].astype(np.float64)
+    values = np.log(values) if log else values - 1
+    max_value = values.max()
+    values = values / max_value if max_value > 0 else values
+    stops = np.linspace(0, 1, len(colormap))
+    colors = np.stack([np.interp(values, stops, colormap[:, c]) for c in range(3)], axis=1)
+    pixels = surfarray.pixels3d(surf)
+    pixels[visited] = colors.astype(np.uint8)
+    del pixels  # Unlock the surface
+
+
+@profiled()
+def render(
+    all_pos: np.ndarray,
+    walls: np.ndarray,
+    goals: np.ndarray = None,
+    trajectories: List[np.ndarray] = None,
+    bg: _ColorLike = _BLACK,
+    grid: Optional[Tuple[int, int, int]] = None,
+) -> np.ndarray:
+    """
+    Render a maze off-screen, without any display.
+
+    :param all_pos: A matrix of shape (num_pos x 2) containng all the visited positions
+    :type all_pos: np.ndarray
+    :param walls: The wall as a array of shape (num_walls x 2 x 2)
+    :type walls: np.ndarray
+    :param goals: The goals as an array of shape (num_pos x 2), defaults to None
+    :type goals: np.ndarray, optional
+    :param trajectories: The trajectories as a list of array of shape (num_pos x 2), , defaults to None
+    :type trajectories: np.ndarray, optional
+    :param bg: Background color, defaults to BLACK
+    :type bg: Color, optional
+    :param grid: A grid, as a tuple (origin, width, angle), defaults to None
+    :type grid: Optional[Tuple[int, int, int]], optional
+    :return: The RGB image as an array of shape (SCREEN_DIM x SCREEN_DIM x 3). It is a view on the pixels of
+        the rendering surface (no copy), so it is not contiguous.
+    :rtype: np.ndarray
+    """
+    renderer = MazeRenderer(walls, goals, trajectories, bg, grid)
+    renderer.add_positions(all_pos)
+    return renderer.frame()
 
 
+@profiled()
 def render_and_save(
     all_pos: np.ndarray,
     walls: np.ndarray,
     filename: str,
     goals: np.ndarray = None,
     trajectories: List[np.ndarray] = None,
-    bg: Color = BLACK,
+    bg: _ColorLike = _BLACK,
     grid: Optional[Tuple[int, int, int]] = None,
 ):
     """
@@ -149,51 +393,225 @@ def render_and_save(
     :param grid: A grid, as a tuple (origin, width, angle), defaults to None
     :type grid: Optional[Tuple[int, int, int]], optional
     """
-    pygame.init()
-    screen = pygame.display.set_mode((SCREEN_DIM, SCREEN_DIM))
-    surf = Surface((SCREEN_DIM, SCREEN_DIM))
+    from PIL import Image
 
-    # Background
-    surf.fill(bg)
+    im = render(all_pos, walls, goals, trajectories, bg, grid)
+    with stage("render_maze.encode"):
+        im = Image.fromarray(im)
+        im.save(filename)
+
+
+@profiled()
+def render_heatmap(
+    positions: Union[np.ndarray, Iterable[np.ndarray]],
+    walls: np.ndarray,
+    goals: np.ndarray = None,
+    trajectories: List[np.ndarray] = None,
+    bg: _ColorLike = _BLACK,
+    grid: Optional[Tuple[int, int, int]] = None,
+    log: bool = True,
+) -> np.ndarray:
+    """
+    Render a maze with the visited positions as a density heatmap.
+
+    Unlike render(), the cost is linear in the number of positions with a small constant, and the image does not
+    saturate for large numbers of positions.
+
+    :param positions: The visited positions as an array of shape (num_pos x 2), or an iterable of such arrays
+    :type positions: Union[np.ndarray, Iterable[np.ndarray]]
+    :param walls: The wall as a array of shape (num_walls x 2 x 2)
+    :type walls: np.ndarray
+    :param goals: The goals as an array of shape (num_pos x 2), defaults to None
+    :type goals: np.ndarray, optional
+    :param trajectories: The trajectories as a list of array of shape (num_pos x 2), , defaults to None
+    :type trajectories: np.ndarray, optional
+    :param bg: Background color, defaults to BLACK
+    :type bg: Color, optional
+    :param grid: A grid, as a tuple (origin, width, angle), defaults to None
+    :type grid: Optional[Tuple[int, int, int]], optional
+    :param log: Whether to use a log normalization rather than a linear one, defaults to True
+    :type log: bool, optional
+    :return: The RGB image, see render()
+    :rtype: np.ndarray
+    """
+    renderer = MazeRenderer(walls, goals, trajectories, bg, grid)
+    renderer.draw_density(bin_positions(positions), log)
+    return renderer.frame()
+
+
+@profiled()
+def render_heatmap_and_save(
+    positions: Union[np.ndarray, Iterable[np.ndarray]],
+    walls: np.ndarray,
+    filename: str,
+    goals: np.ndarray = None,
+    trajectories: List[np.ndarray] = None,
+    bg: _ColorLike = _BLACK,
+    grid: Optional[Tuple[int, int, int]] = None,
+    log: bool = True,
+):
+    """
+    Render and save a maze with the visited positions as a density heatmap.
+
+    :param positions: The visited positions as an array of shape (num_pos x 2), or an iterable of such arrays
+    :type positions: Union[np.ndarray, Iterable[np.ndarray]]
+    :param walls: The wall as a array of shape (num_walls x 2 x 2)
+    :type walls: np.ndarray
+    :param filename: The filename of the output image
+    :type filename: str
+    :param goals: The goals as an array of shape (num_pos x 2), defaults to None
+    :type goals: np.ndarray, optional
+    :param trajectories: The trajectories as a list of array of shape (num_pos x 2), , defaults to None
+    :type trajectories: np.ndarray, optional
+    :param bg: Background color, defaults to BLACK
+    :type bg: Color, optional
+    :param grid: A grid, as a tuple (origin, width, angle), defaults to None
+    :type grid: Optional[Tuple[int, int, int]], optional
+    :param log: Whether to use a log normalization rather than a linear one, defaults to True
+    :type log: bool, optional
+    """
+    from PIL import Image
+
+    im = render_heatmap(positions, walls, goals, trajectories, bg, grid, log)
+    with stage("render_maze.encode"):
+        im = Image.fromarray(im)
+        im.save(filename)
+
+
+class MazeRenderer:
+    """
+    Render frames of the same maze, for an increasing set of visited positions.
+
+    The background, the grid, and the geometry of the trajectories and walls are built once. Each new batch
+    of positions is drawn onto the previous ones, so a frame only costs the new points and the final
+    compositing of goals, trajectories and walls.
+
+    :param walls: The wall as a array of shape (num_walls x 2 x 2)
+    :type walls: np.ndarray
+    :param goals: The goals as an array of shape (num_pos x 2), defaults to None
+    :type goals: np.ndarray, optional
+    :param trajectories: The trajectories as a list of array of shape (num_pos x 2), , defaults to None
+    :type trajectories: np.ndarray, optional
+    :param bg: Background color, defaults to BLACK
+    :type bg: Color, optional
+    :param grid: A grid, as a tuple (origin, width, angle), defaults to None
+    :type grid: Optional[Tuple[int, int, int]], optional
+    """
+
+    def __init__(
+        self,
+        walls: np.ndarray,
+        goals: np.ndarray = None,
+        trajectories: List[np.ndarray] = None,
+        bg: _ColorLike = _BLACK,
+        grid: Optional[Tuple[int, int, int]] = None,
+    ) -> None:
+        import pygame
+
+        size = (SCREEN_DIM, SCREEN_DIM)
+        if grid is None:
+            self._background = pygame.Surface(size)
+            self._background.fill(bg)
+        else:
+            origin, width, angle = grid
+            self._background = _grid_layer(origin, width, angle, tuple(pygame.Color(bg)))
+        self._goals = goals
+        self._trajectory_quads = []
+        trajectories = [] if trajectories is None else trajectories
+        for trajectory in trajectories:
+            trajectory = np.asarray(trajectory, dtype=np.float64)
+            if len(trajectory) > 1:
+                quads = _line_quads(trajectory[:-1], trajectory[1:], thickness=2)
+                self._trajectory_quads.extend(_visible_quads(quads, size))
+        walls = np.asarray(walls, dtype=np.float64).reshape(-1, 2, 2)
+        self._wall_quads = _visible_quads(_line_quads(walls[:, 0], walls[:, 1], thickness=2), size)
+        self._wall_color = _BLACK if pygame.Color(bg) == pygame.Color(_WHITE) else _WHITE
+        self.reset()
+
+    def reset(self) -> None:
+        """Remove all the visited positions."""
+        self._points = self._background.copy()
+
+    @profiled()
+    def add_positions(self, positions: np.ndarray) -> None:
+        """
+        Add visited positions.
+
+        :param positions: The new visited positions, as an array of shape (num_pos x 2)
+        :type positions: np.ndarray
+        """
+        draw_filled_circles(self._points, positions)
+
+    @profiled()
+    def draw_density(self, counts: np.ndarray, log: bool = True) -> None:
+        """
+        Draw visit counts as a heatmap, over the positions drawn so far.
+
+        The counts are not added to the previous ones: the pixels of the visited cells are overwritten, with colors
+        normalized by these counts only.
+
+        :param counts: The counts as returned by bin_positions
+        :type counts: np.ndarray
+        :param log: Whether to use a log normalization rather than a linear one, defaults to True
+        :type log: bool, optional
+        """
+        draw_density(self._points, counts, log)
+
+    @profiled()
+    def frame(self) -> np.ndarray:
+        """
+        Render the current frame.
+
+        :return: The RGB image as an array of shape (SCREEN_DIM x SCREEN_DIM x 3). It is a view on the pixels of
+            a new surface (no copy), so it is not contiguous.
+        :rtype: np.ndarray
+        """
+        from pygame import surfarray
+
+        surf = self._points.copy()
+        if self._goals is not None:
+            draw_filled_circles(surf, self._goals, color=_GREEN)
+        _draw_quads(surf, self._trajectory_quads, _GREEN)
+        _draw_quads(surf, self._wall_quads, self._wall_color)
+        # Rows of the image go downward, y goes upward: flip while transposing to (height, width, 3)
+        return np.transpose(surfarray.pixels3d(surf), axes=(1, 0, 2))[::-1]
+
+    def render_frames(self, position_batches: Iterable[np.ndarray]) -> Iterator[np.ndarray]:
+        """
+        Yield one frame per batch of positions, each frame adding the batch to the previous ones.
+
+        :param position_batches: The batches of new visited positions, each as an array of shape (num_pos x 2)
+        :type position_batches: Iterable[np.ndarray]
+        :return: The frames, see frame()
+        :rtype: Iterator[np.ndarray]
+        """
+        for positions in position_batches:
+            self.add_positions(positions)
+            yield self.frame()
+
+    @profiled()
+    def save_frames(self, position_batches: Iterable[np.ndarray], filename: str, duration: int = 100) -> None:
+        """
+        Render one frame per batch of positions and save them, as a GIF or as an image sequence.
+
+        Frames are streamed: they are never all held in memory as arrays.
+
+        :param position_batches: The batches of new visited positions, each as an array of shape (num_pos x 2)
+        :type position_batches: Iterable[np.ndarray]
+        :param filename: The filename. If it ends with ".gif", the frames are saved as an animated GIF.
+            Otherwise, it must contain a format field, such as "frame_{:04d}.png", filled with the frame index.
+        :type filename: str
+        :param duration: Display duration of each frame of the GIF, in milliseconds, defaults to 100
+        :type duration: int, optional
+        """
+        from PIL import Image
 
-    if grid is not None:
-        origin, width, angle = grid
-        for i in range(400):
-            draw_line(
-                surf,
-                rot(np.array([-20, (i - 200 + origin) * width]), angle),
-                rot(np.array([20, (i - 200 + origin) * width]), angle),
-                color=GRAY,
-                thickness=1,
-            )
-            draw_line(
-                surf,
-                rot(np.array([(i - 200 + origin) * width, -20]), angle),
-                rot(np.array([(i - 200 + origin) * width, 20]), angle),
-                color=GRAY,
-                thickness=1,
-            )
-
-    # Draw visited points
-    for pos in all_pos:
-        draw_filled_circle(surf, pos)
-
-    # Draw goals if any
-    goals = [] if goals is None else goals
-    for pos in goals:
-        draw_filled_circle(surf, pos, color=GREEN)
-
-    trajectories = [] if trajectories is None else trajectories
-    for trajectory in trajectories:
-        for i in range(len(trajectory) - 1):
-            draw_line(surf, trajectory[i], trajectory[i + 1], color=GREEN)
-
-    # Draw walls
-    for point_a, point_b in walls:
-        draw_line(surf, point_a, point_b, color=BLACK if bg == WHITE else WHITE)
-
-    surf = pygame.transform.flip(surf, flip_x=False, flip_y=True)
-    screen.blit(surf, (0, 0))
-    im = np.transpose(np.array(pygame.surfarray.pixels3d(screen)), axes=(1, 0, 2))
-    im = Image.fromarray(im)
-    im.save(filename)
+        images = (Image.fromarray(frame) for frame in self.render_frames(position_batches))
+        if filename.lower().endswith(".gif"):
+            first = next(images, None)
+            if first is None:
+                raise ValueError("No frames to save, position_batches is empty")
+            first.save(filename, save_all=True, append_images=images, duration=duration, loop=0)
+        else:
+            for i, image in enumerate(images):
+                image.save(filename.format(i))
@@ -1,73 +1,341 @@
-from typing import List, Optional, Tuple
+import os
+import struct
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
-import rliable.library as rly
-from rliable import metrics
-from scipy.interpolate import interp1d
 
+from toolbox.dat import write_dat
+from toolbox.profiling import profiled, stage
 
-def load_eval(file: str, key: str = "results") -> Tuple[np.ndarray, np.ndarray]:
+# zipfile and concurrent.futures are imported where they are used: they are slow to import, and most processes
+# importing this module, such as the bootstrap workers, never use them
+if TYPE_CHECKING:
+    from toolbox.cache import ResultCache
+
+
+def _memmap_npz_members(f, names: Sequence[str]) -> Optional[Tuple[np.ndarray, ...]]:
+    # Memory-map arrays stored without compression in an open .npz file, None if one of them can't be memory-mapped
+    import zipfile
+
+    with zipfile.ZipFile(f) as archive:
+        infos = [archive.getinfo(name + ".npy") for name in names]
+    if any(info.compress_type != zipfile.ZIP_STORED for info in infos):
+        return None
+    arrays = []
+    for info in infos:
+        # The data starts after the local file header, whose name and extra fields can differ from the central one
+        f.seek(info.header_offset)
+        local_header = f.read(30)
+        name_length, extra_length = struct.unpack("<HH", local_header[26:30])
+        f.seek(info.header_offset + 30 + name_length + extra_length)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        elif version == (2, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        else:
+            return None
+        if dtype.hasobject:
+            return None
+        if np.prod(shape) == 0:
+            arrays.append(np.empty(shape, dtype=dtype))
+        else:
+            order = "F" if fortran_order else "C"
+            arrays.append(np.memmap(f, dtype=dtype, mode="r", shape=shape, order=order, offset=f.tell()))
+    return tuple(arrays)
+
+
+@profiled()
+def load_eval(file: str, key: str = "results", mmap: bool = False) -> Tuple[np.ndarray, np.ndarray]:
     """
     Reads evaluations.npz and returns timesteps and results
 
     :param file: File path.
     :type file: str
+    :param key: The key of the values, defaults to "results"
+    :type key: str, optional
+    :param mmap: Whether to memory-map the arrays stored without compression instead of reading them, defaults
+        to False
+    :type mmap: bool, optional
     :return: Timesteps and results as an array of shape (num_evals x num_timesteps)
     :rtype: Tuple[np.ndarray, np.ndarray]
     """
-    timesteps = np.load(file)["timesteps"]
-    values = np.load(file)[key]
-    return timesteps, values
+    with open(file, "rb") as f:
+        if mmap:
+            arrays = _memmap_npz_members(f, ("timesteps", key))
+            if arrays is not None:
+                return arrays
+            f.seek(0)
+        with np.load(f) as data:
+            return data["timesteps"], data[key]
+
+
+def _load_runs(files: List[str], key: str, n_workers: Optional[int]) -> List[Tuple[np.ndarray, np.ndarray]]:
+    # Read the files concurrently, memory-mapping the arrays stored without compression
+    from concurrent.futures import ThreadPoolExecutor
 
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        return list(executor.map(lambda file: load_eval(file, key, mmap=True), files))
 
-def load_evals(files: List[str], key: str = "results") -> Tuple[np.ndarray, np.ndarray]:
+
+@profiled()
+def load_evals(
+    files: List[str], key: str = "results", dtype: Optional[np.dtype] = None, n_workers: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
     """
-    Load the evaluations generated by SB3 learning.
+    Load the evaluations generated by SB3 learning, truncating all runs to the shortest one.
+
+    The files are read concurrently, each one opened once. Arrays stored without compression (the SB3 default)
+    are memory-mapped and copied straight into the output. See load_evals_padded to keep the runs whole.
 
     :param files: A list of path to the numpy results files
+    :param key: The key of the values, defaults to "results"
+    :param dtype: The dtype of the output values, for example np.float32, defaults to None (dtype of the files)
+    :param n_workers: Number of reading threads, defaults to None (chosen by ThreadPoolExecutor)
     :return: Timesteps and results as an array of shape (num_runs x num_evals x num_timesteps)
     """
-    all_timesteps_values = [load_eval(file, key) for file in files]
-    timesteps = all_timesteps_values[0][0]
-    values = [timesteps_values[1] for timesteps_values in all_timesteps_values]
-    values = np.stack(values)
+    runs = _load_runs(files, key, n_workers)
+    length = min(len(timesteps) for timesteps, _ in runs)
+    dtype = np.result_type(*[values.dtype for _, values in runs]) if dtype is None else dtype
+    timesteps = np.array(runs[0][0][:length])
+    values = np.empty((len(files), length, *runs[0][1].shape[1:]), dtype=dtype)
+    for i, (_, run_values) in enumerate(runs):
+        values[i] = run_values[:length]
     return timesteps, values
 
 
-def iqm(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+@profiled()
+def load_evals_padded(
+    files: List[str], key: str = "results", dtype: Optional[np.dtype] = None, n_workers: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Load the evaluations generated by SB3 learning, padding all runs with NaN up to the longest one.
+
+    The files are read as in load_evals.
+
+    :param files: A list of path to the numpy results files
+    :param key: The key of the values, defaults to "results"
+    :param dtype: The dtype of the output values, for example np.float32, defaults to None (dtype of the files,
+        promoted to a floating dtype to hold NaN)
+    :param n_workers: Number of reading threads, defaults to None (chosen by ThreadPoolExecutor)
+    :return: Timesteps of the longest run, results as an array of shape (num_runs x num_evals x num_timesteps),
+        and the mask of the valid values, as a boolean array of shape (num_runs x num_evals)
+    """
+    runs = _load_runs(files, key, n_workers)
+    lengths = np.array([len(timesteps) for timesteps, _ in runs])
+    dtype = np.result_type(*[values.dtype for _, values in runs]) if dtype is None else dtype
+    timesteps = np.array(runs[np.argmax(lengths)][0])
+    values = np.full(
+        (len(files), lengths.max(), *runs[0][1].shape[1:]), np.nan, dtype=np.result_type(dtype, np.float16)
+    )
+    for i, (_, run_values) in enumerate(runs):
+        values[i, : len(run_values)] = run_values
+    mask = np.arange(lengths.max()) < lengths[:, None]
+    return timesteps, values, mask
+
+
+# Maximum number of resampled scores held in memory at once by the bootstrap
+BOOTSTRAP_CHUNK_SIZE = 2**24
+
+
+def _interquartile_mean(values: np.ndarray, axis: int) -> np.ndarray:
+    # 25% trimmed mean along the axis, computed like scipy.stats.trim_mean
+    num_runs = values.shape[axis]
+    lowercut = int(0.25 * num_runs)
+    uppercut = num_runs - lowercut
+    values = np.moveaxis(np.partition(values, (lowercut, uppercut - 1), axis=axis), axis, -1)
+    return values[..., lowercut:uppercut].mean(axis=-1)
+
+
+@profiled()
+def iqm(
+    values: np.ndarray,
+    reps: int = 5000,
+    confidence: float = 0.95,
+    seed: Optional[int] = None,
+    cache: Optional["ResultCache"] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
     Return the interquartile mean across runs and the 95% confidence interval.
 
+    The confidence interval is computed with a stratified percentile bootstrap: the runs are resampled
+    independently for every timestep, as in rliable. All timesteps are processed at once, in chunks of
+    repetitions bounded by BOOTSTRAP_CHUNK_SIZE.
+
     :param values: The values as a matrix of the shape (num_runs x num_timesteps)
     :type values: np.ndarray
+    :param reps: Number of bootstrap repetitions, defaults to 5000
+    :type reps: int, optional
+    :param confidence: Coverage of the confidence interval, defaults to 0.95
+    :type confidence: float, optional
+    :param seed: Seed of the bootstrap resampling, defaults to None
+    :type seed: Optional[int], optional
+    :param cache: If set, reuse the result of a previous call with the same values and parameters. Only used with
+        a seed, as without one every call draws other resamples, defaults to None
+    :type cache: Optional[ResultCache], optional
     :return: The IQM, the lower bound confidence and the upper bound confidence
     :rtype: Tuple[np.ndarray, np.ndarray, np.ndarray]
     """
-    scores_dict = {"algo": values}
-    func = lambda scores: np.array([metrics.aggregate_iqm(s) for s in scores.T])
-    iqm_scores, iqm_cis = rly.get_interval_estimates(scores_dict, func, reps=5000)
-    return iqm_scores["algo"], iqm_cis["algo"][0], iqm_cis["algo"][1]
+    if cache is not None and seed is not None:
+        return cache.call(iqm, values, reps=reps, confidence=confidence, seed=seed)
+    med, lowq, highq = _bootstrap_iqm(values[None], reps, confidence, seed)
+    return med[0], lowq[0], highq[0]
 
 
-def performance_profile(values: np.ndarray, thresholds: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+@profiled()
+def _bootstrap_iqm(
+    values: np.ndarray, reps: int, confidence: float, seed: Union[None, int, np.random.SeedSequence]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Same as iqm, for values of shape (num_batches x num_runs x num_timesteps). The same resample indices
+    # are used for every batch: the chunks only depend on the shape of one batch, so that the indices do not
+    # depend on the number of batches. The batches are gathered one at a time, so that the memory of a chunk
+    # does not depend on the number of batches either.
+    rng = np.random.default_rng(seed)
+    num_batches, num_runs, num_timesteps = values.shape
+    chunk_reps = max(1, BOOTSTRAP_CHUNK_SIZE // max(1, num_runs * num_timesteps))
+    estimates = np.empty((num_batches, reps, num_timesteps))
+    # Runs on the last axis, so that the gather and the partition work on contiguous memory
+    values_t = np.ascontiguousarray(values.transpose(0, 2, 1))
+    columns = np.arange(num_timesteps)[:, None]
+    for start in range(0, reps, chunk_reps):
+        stop = min(start + chunk_reps, reps)
+        with stage("to_dat.bootstrap.resample", size=num_batches * (stop - start) * num_timesteps * num_runs):
+            indices = rng.integers(num_runs, size=(stop - start, num_timesteps, num_runs), dtype=np.int32)
+            for batch in range(num_batches):
+                estimates[batch, start:stop] = _interquartile_mean(values_t[batch, columns, indices], axis=2)
+    tail = 100 * (1 - confidence) / 2
+    with stage("to_dat.bootstrap.percentile", size=estimates.size):
+        lowq, highq = np.percentile(estimates, (tail, 100 - tail), axis=1)
+    return _interquartile_mean(values, axis=1), lowq, highq
+
+
+@profiled()
+def performance_profile(
+    values: np.ndarray,
+    thresholds: Optional[np.ndarray] = None,
+    reps: int = 2000,
+    confidence: float = 0.95,
+    seed: Optional[int] = None,
+    cache: Optional["ResultCache"] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
     Return the performance profile under the thresholds.
 
+    The profile is the fraction of values strictly greater than each threshold. The values are sorted once, so
+    any number of thresholds is cheap. The confidence interval is computed with a stratified percentile bootstrap,
+    as in rliable, all repetitions of a chunk at once.
+
     :param values: The values as a matrix of the shape (num_runs x num_evals)
     :type values: np.ndarray
-    :param thresholds: The thresholds on which the values is evaluated
-    :type thresholds: np.ndarray
+    :param thresholds: The thresholds on which the values is evaluated. If None, the exact profile is evaluated at
+        every distinct value, np.unique(values), defaults to None
+    :type thresholds: np.ndarray, optional
+    :param reps: Number of bootstrap repetitions, defaults to 2000
+    :type reps: int, optional
+    :param confidence: Coverage of the confidence interval, defaults to 0.95
+    :type confidence: float, optional
+    :param seed: Seed of the bootstrap resampling, defaults to None
+    :type seed: Optional[int], optional
+    :param cache: If set, reuse the result of a previous call with the same values and parameters. Only used with
+        a seed, as without one every call draws other resamples, defaults to None
+    :type cache: Optional[ResultCache], optional
     :return: The performance profile, the upper confidence bound and the lower confidence bound
     :rtype: Tuple[np.ndarray, np.ndarray, np.ndarray]
     """
-    scores_dict = {"algo": values}
-    score_distributions, score_distributions_cis = rly.create_performance_profile(scores_dict, thresholds)
-    return score_distributions["algo"], score_distributions_cis["algo"][0], score_distributions_cis["algo"][1]
+    if cache is not None and seed is not None:
+        params = dict(thresholds=thresholds, reps=reps, confidence=confidence, seed=seed)
+        return cache.call(performance_profile, values, **params)
+    thresholds = np.unique(values) if thresholds is None else np.asarray(thresholds, dtype=np.float64)
+    order = np.argsort(thresholds)
+    sorted_thresholds = thresholds[order]
+    num_runs, num_evals = values.shape
+    num_thresholds = len(thresholds)
+
+    # Number of thresholds strictly below each value: the value is above the thresholds j < rank
+    ranks = np.searchsorted(sorted_thresholds, values, side="left")
+    # The estimates of all the repetitions are needed for the percentiles. With many thresholds, they are computed
+    # by blocks of thresholds, each block drawing the same resamples again from the seed sequence.
+    seed_sequence = np.random.SeedSequence(seed)
+    block_size = max(1, BOOTSTRAP_CHUNK_SIZE // reps)
+    chunk_reps = max(1, BOOTSTRAP_CHUNK_SIZE // max(1, values.size, min(num_thresholds, block_size)))
+    columns = np.arange(num_evals)
+    tail = 100 * (1 - confidence) / 2
+    lowq, highq = np.empty(num_thresholds), np.empty(num_thresholds)
+    for first in range(0, num_thresholds, block_size):
+        last = min(first + block_size, num_thresholds)
+        num_block = last - first
+        # The values below the block are above none of its thresholds, the values above it are above all of them
+        block_ranks = np.clip(ranks - first, 0, num_block)
+        rng = np.random.default_rng(seed_sequence)
+        estimates = np.empty((reps, num_block))
+        for start in range(0, reps, chunk_reps):
+            stop = min(start + chunk_reps, reps)
+            indices = rng.integers(num_runs, size=(stop - start, num_runs, num_evals), dtype=np.int32)
+            resampled_ranks = block_ranks[indices, columns].reshape(stop - start, -1)
+            # Count the ranks of every repetition with a single bincount, by offsetting each repetition
+            offsets = (np.arange(stop - start) * (num_block + 1))[:, None]
+            counts = np.bincount((resampled_ranks + offsets).ravel(), minlength=(stop - start) * (num_block + 1))
+            counts = counts.reshape(stop - start, num_block + 1)
+            above = np.cumsum(counts[:, ::-1], axis=1)[:, ::-1]  # above[:, k] is the number of ranks >= k
+            estimates[start:stop] = above[:, 1:] / values.size
+        lowq[first:last], highq[first:last] = np.percentile(estimates, (tail, 100 - tail), axis=0)
+    sorted_values = np.sort(values, axis=None)
+    profile = 1 - np.searchsorted(sorted_values, sorted_thresholds, side="right") / values.size
+
+    # Back to the order of the input thresholds
+    inverse = np.empty_like(order)
+    inverse[order] = np.arange(num_thresholds)
+    return profile[inverse], lowq[inverse], highq[inverse]
+
 
+def _nearest_indices(num_timesteps: int, target_length: int) -> np.ndarray:
+    # Evenly spaced indices, rounded to the nearest index (halves rounded down)
+    new_idx = np.arange(target_length) * num_timesteps / target_length
+    return np.searchsorted(np.arange(1, num_timesteps) - 0.5, new_idx, side="left")
 
-def rescale(values: np.ndarray, timesteps: np.ndarray, target_length: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+
+def _minmax_indices(signal: np.ndarray, target_length: int) -> np.ndarray:
+    # Indices of the minimum and the maximum of each of the target_length // 2 buckets
+    num_buckets = max(1, target_length // 2)
+    if num_buckets >= len(signal):  # At most one timestep per bucket, and empty buckets: keep every timestep
+        return np.arange(len(signal))
+    buckets = np.arange(len(signal)) * num_buckets // len(signal)
+    order = np.lexsort((signal, buckets))  # Sorted by bucket, then by value
+    ends = np.searchsorted(buckets[order], np.arange(num_buckets), side="right")
+    starts = np.concatenate(([0], ends[:-1]))
+    return np.unique(np.concatenate((order[starts], order[ends - 1])))
+
+
+def _lttb_indices(x: np.ndarray, signal: np.ndarray, target_length: int) -> np.ndarray:
+    # Largest-triangle-three-buckets: keep the first and last points, and in each bucket between them, the point
+    # forming the largest triangle with the previously kept point and the average of the next bucket
+    num_timesteps = len(signal)
+    if target_length >= num_timesteps or target_length < 3:
+        return _nearest_indices(num_timesteps, min(target_length, num_timesteps))
+    bounds = 1 + (np.arange(target_length - 1) * (num_timesteps - 2)) // (target_length - 2)
+    averages_x = np.append(np.add.reduceat(x[1:-1], bounds[:-1] - 1) / np.diff(bounds), x[-1])
+    averages_y = np.append(np.add.reduceat(signal[1:-1], bounds[:-1] - 1) / np.diff(bounds), signal[-1])
+    indices = np.empty(target_length, dtype=np.int64)
+    indices[0], indices[-1] = 0, num_timesteps - 1
+    for i in range(target_length - 2):
+        a = indices[i]
+        start, stop = bounds[i], bounds[i + 1]
+        areas = np.abs(
+            (x[a] - averages_x[i + 1]) * (signal[start:stop] - signal[a])
+            - (x[a] - x[start:stop]) * (averages_y[i + 1] - signal[a])
+        )
+        indices[i + 1] = start + np.argmax(areas)
+    return indices
+
+
+@profiled()
+def rescale(
+    values: np.ndarray, timesteps: np.ndarray, target_length: np.ndarray, method: str = "nearest"
+) -> Tuple[np.ndarray, np.ndarray]:
     """
-    Rescale the values with a target lenght by interpolation.
+    Rescale the values with a target lenght by downsampling.
+
+    The same timesteps are kept for all runs. With "minmax" and "lttb", they are selected on the mean across runs.
 
     :param values: Inital values
     :type values: np.ndarray
@@ -75,22 +343,45 @@ def rescale(values: np.ndarray, timesteps: np.ndarray, target_length: np.ndarray
     :type timesteps: np.ndarray
     :param target_length: The target number of timesteps
     :type target_length: np.ndarray
+    :param method: The downsampling method, defaults to "nearest"
+        - "nearest": evenly spaced timesteps
+        - "minmax": the timesteps of the minimum and the maximum in each of target_length / 2 buckets, which keeps
+          spikes and dips
+        - "lttb": largest-triangle-three-buckets, which keeps the visual shape of the curve
+    :type method: str, optional
     :return: The new values and the new timesteps with the new lenght
     :rtype: Tuple[np.ndarray, np.ndarray]
     """
-    old_idx = np.arange(values.shape[1])
-    f = interp1d(old_idx, old_idx, kind="nearest")
-    new_idx = np.arange(target_length) * values.shape[1] / target_length
-    new_idx = f(new_idx).astype(np.int64)
+    signal = np.mean(values, axis=0) if method != "nearest" else None
+    new_idx = _rescale_indices(timesteps, target_length, method, signal)
     return values[:, new_idx], timesteps[new_idx]
 
 
+def _rescale_indices(
+    timesteps: np.ndarray, target_length: int, method: str, signal: Optional[np.ndarray]
+) -> np.ndarray:
+    # Indices kept by rescale; signal is the mean across runs, unused by "nearest"
+    if method == "nearest":
+        return _nearest_indices(len(timesteps), target_length)
+    elif method == "minmax":
+        return _minmax_indices(signal, target_length)
+    elif method == "lttb":
+        return _lttb_indices(timesteps.astype(np.float64), signal, target_length)
+    else:
+        raise ValueError(f"Unknown method {method}, must be 'nearest', 'minmax' or 'lttb'")
+
+
+@profiled()
 def save_iqm(
     values: np.ndarray,
     timesteps: np.ndarray = None,
     step: int = 1,
     filename: str = "result.dat",
     target_length: Optional[int] = None,
+    downsampling: str = "nearest",
+    seed: Optional[int] = None,
+    cache: Optional["ResultCache"] = None,
+    sidecar: bool = False,
 ) -> None:
     """
     Save the interquartile mean across runs and the 95% confidence interval.
@@ -104,8 +395,16 @@ def save_iqm(
     :param target_length: The target number of elements in the output file. Downsample if necessary.
         If None, stores every inputs elements.
     :type target_length: int or None, optional
-    :param quantiles: The quantiles to compute; values must be between 0 and 1
-    :type quantiles: List or None, optional
+    :param downsampling: The downsampling method, see rescale(), defaults to "nearest"
+    :type downsampling: str, optional
+    :param seed: Seed of the bootstrap resampling, defaults to None
+    :type seed: Optional[int], optional
+    :param cache: If set, reuse the result of a previous call with the same values and parameters. Only used with
+        a seed, as without one every call draws other resamples, defaults to None
+    :type cache: Optional[ResultCache], optional
+    :param sidecar: Also save the values in full precision to a binary sidecar, filename + ".npy", see
+        toolbox.dat.load_dat, defaults to False
+    :type sidecar: bool, optional
 
     ```
     timestep med lowq highq
@@ -116,15 +415,217 @@ def save_iqm(
     """
     timesteps = timesteps if timesteps is not None else np.arange(values.shape[1]) * step
     if target_length is not None:
-        values, timesteps = rescale(values, timesteps, target_length)
-    med, lowq, highq = iqm(values)
+        values, timesteps = rescale(values, timesteps, target_length, downsampling)
+    med, lowq, highq = iqm(values, seed=seed, cache=cache)
+    _write_iqm(filename, timesteps, med, lowq, highq, sidecar=sidecar)
+
+
+def _write_iqm(
+    filename: str,
+    timesteps: np.ndarray,
+    med: np.ndarray,
+    lowq: np.ndarray,
+    highq: np.ndarray,
+    append: bool = False,
+    sidecar: bool = False,
+) -> None:
     out = np.vstack((timesteps, med, lowq, highq)).transpose()
     header = " ".join(("timestep", "iqm", "lowq", "highq"))
     fmt = " ".join(("%d", "%.3f", "%.3f", "%.3f"))
-    np.savetxt(filename, out, fmt=fmt, header=header, comments="")
+    write_dat(filename, out, fmt, header, append=append, sidecar=sidecar)
+
+
+def last_timestep(filename: str) -> Optional[float]:
+    """
+    Return the timestep of the last row of a .dat file, reading only the end of the file.
+
+    :param filename: The .dat filename
+    :type filename: str
+    :return: The timestep, None if the file does not exist or has no row
+    :rtype: Optional[float]
+    """
+    if not os.path.exists(filename):
+        return None
+    with open(filename, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        f.seek(max(0, end - 4096))  # The last row is much shorter than that
+        lines = f.read().splitlines()
+    try:
+        return float(lines[-1].split()[0])
+    except (IndexError, ValueError):  # Empty, or header only
+        return None
+
+
+def _new_columns(
+    values: np.ndarray, timesteps: Optional[np.ndarray], step: int, filename: str
+) -> Tuple[np.ndarray, np.ndarray]:
+    # The values and timesteps not already in the file
+    timesteps = timesteps if timesteps is not None else np.arange(values.shape[1]) * step
+    last = last_timestep(filename)
+    if last is not None:
+        new = timesteps > last
+        values, timesteps = values[:, new], timesteps[new]
+    return values, timesteps
+
+
+@profiled()
+def update_iqm(
+    values: np.ndarray,
+    timesteps: np.ndarray = None,
+    step: int = 1,
+    filename: str = "result.dat",
+    seed: Optional[int] = None,
+    sidecar: bool = False,
+) -> int:
+    """
+    Append the interquartile mean and the 95% confidence interval of the new timesteps to a file written by save_iqm.
+
+    Only the timesteps greater than the last one of the file are computed, so the cost grows with the new data,
+    not with the full history. If the file does not exist, it is created.
+
+    :param values: The values as a matrix of the shape (num_runs x num_timesteps)
+    :type values: np.ndarray
+    :param timesteps: Timesteps as a 1D array of size num_timesteps, defaults to None
+    :type timesteps: np.ndarray, optional
+    :param step: When timesteps is None, use this number as number timesteps between values, defaults to 1
+    :type step: int, optional
+    :param filename: Filename for saving, defaults to "result.dat".
+    :type filename: str, optional
+    :param seed: Seed of the bootstrap resampling, defaults to None
+    :type seed: Optional[int], optional
+    :param sidecar: Also append the values to the binary sidecar of the file, if it is up to date with the file,
+        see toolbox.dat.write_dat, defaults to False
+    :type sidecar: bool, optional
+    :return: The number of rows appended
+    :rtype: int
+    """
+    values, timesteps = _new_columns(values, timesteps, step, filename)
+    if values.shape[1] > 0:
+        med, lowq, highq = iqm(values, seed=seed)
+        _write_iqm(filename, timesteps, med, lowq, highq, append=True, sidecar=sidecar)
+    return values.shape[1]
+
+
+@profiled(size=lambda values, *args, **kwargs: sum(v.size for v in values.values()))
+def save_iqms(
+    values: Dict[Tuple[str, str], np.ndarray],
+    timesteps: Union[None, np.ndarray, Dict[Tuple[str, str], np.ndarray]] = None,
+    step: int = 1,
+    filename: str = "{algo}_{env}.dat",
+    target_length: Optional[int] = None,
+    downsampling: str = "nearest",
+    seed: Optional[int] = None,
+    n_workers: Optional[int] = None,
+    cache: Optional["ResultCache"] = None,
+    sidecar: bool = False,
+) -> None:
+    """
+    Save the interquartile mean across runs and the 95% confidence interval, for several algorithms and
+    environments at once.
 
+    The value matrices with the same shape are bootstrapped together, with the same resample indices, drawn from
+    the seed and the shape. The bootstraps are spread across a pool of processes. For a given seed, the result for
+    an (algo, env) only depends on its values: not on n_workers, nor on the other values.
 
-def save_performance_profile(values: np.ndarray, min_val: float, max_val: float, filename: str = "result.dat") -> None:
+    :param values: The values as a mapping from (algo, env) to a matrix of the shape (num_runs x num_timesteps)
+    :type values: Dict[Tuple[str, str], np.ndarray]
+    :param timesteps: Timesteps as a 1D array of size num_timesteps, shared or given per (algo, env),
+        defaults to None
+    :type timesteps: Union[None, np.ndarray, Dict[Tuple[str, str], np.ndarray]], optional
+    :param step: When timesteps is None, use this number as number timesteps between values, defaults to 1
+    :type step: int, optional
+    :param filename: Filename for saving, formatted with algo and env, defaults to "{algo}_{env}.dat".
+    :type filename: str, optional
+    :param target_length: The target number of elements in the output files. Downsample if necessary.
+        If None, stores every inputs elements.
+    :type target_length: int or None, optional
+    :param downsampling: The downsampling method, see rescale(), defaults to "nearest"
+    :type downsampling: str, optional
+    :param seed: Seed of the bootstrap resampling, defaults to None
+    :type seed: Optional[int], optional
+    :param n_workers: Number of worker processes, defaults to None (number of processors)
+    :type n_workers: Optional[int], optional
+    :param cache: If set, reuse the results of a previous call with the same values and parameters, and only
+        bootstrap the other ones. Only used with a seed, as without one every call draws other resamples, defaults
+        to None
+    :type cache: Optional[ResultCache], optional
+    :param sidecar: Also save the values in full precision to binary sidecars, filename + ".npy", see
+        toolbox.dat.load_dat, defaults to False
+    :type sidecar: bool, optional
+    """
+    # Prepare the values, and group the keys by shape
+    all_values, all_timesteps, groups = {}, {}, {}
+    for key, key_values in values.items():
+        key_timesteps = timesteps.get(key) if isinstance(timesteps, dict) else timesteps
+        key_timesteps = key_timesteps if key_timesteps is not None else np.arange(key_values.shape[1]) * step
+        if target_length is not None:
+            key_values, key_timesteps = rescale(key_values, key_timesteps, target_length, downsampling)
+        all_values[key], all_timesteps[key] = key_values, key_timesteps
+        groups.setdefault(key_values.shape, []).append(key)
+
+    # Every group has its own seed, shared by all its batches, derived from its shape only, so that adding or
+    # changing the values of a group does not change the seed of the others
+    shapes = sorted(groups)
+    group_seeds = {shape: np.random.SeedSequence(seed, spawn_key=shape) for shape in shapes}
+
+    # The result for a key only depends on its values and on the seed of its group
+    cache = cache if seed is not None else None
+    cache_keys = {}
+    if cache is not None:
+        for shape in shapes:
+            for key in list(groups[shape]):
+                params = dict(reps=5000, confidence=0.95, seed=seed, spawn_key=group_seeds[shape].spawn_key)
+                cache_keys[key] = cache.key("_bootstrap_iqm", all_values[key], **params)
+                result = cache.get(cache_keys[key])
+                if result is not None:
+                    _write_iqm(filename.format(algo=key[0], env=key[1]), all_timesteps[key], *result, sidecar=sidecar)
+                    groups[shape].remove(key)
+    shapes = [shape for shape in shapes if groups[shape]]
+
+    n_workers = n_workers if n_workers is not None else os.cpu_count()
+    batches = []
+    for shape in shapes:
+        keys = groups[shape]
+        num_batches = min(len(keys), max(1, n_workers // len(shapes)))
+        batches.extend((shape, batch_keys) for batch_keys in np.array_split(np.arange(len(keys)), num_batches))
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = []
+        for shape, batch_idx in batches:
+            batch_keys = [groups[shape][i] for i in batch_idx]
+            batch_values = np.stack([all_values[key] for key in batch_keys])
+            future = executor.submit(_bootstrap_iqm, batch_values, 5000, 0.95, group_seeds[shape])
+            futures.append((batch_keys, future))
+        for batch_keys, future in futures:
+            with stage("to_dat.save_iqms.wait"):
+                med, lowq, highq = future.result()
+            for i, (algo, env) in enumerate(batch_keys):
+                _write_iqm(
+                    filename.format(algo=algo, env=env),
+                    all_timesteps[(algo, env)],
+                    med[i],
+                    lowq[i],
+                    highq[i],
+                    sidecar=sidecar,
+                )
+                if cache is not None:
+                    cache.put(cache_keys[(algo, env)], (med[i], lowq[i], highq[i]))
+
+
+@profiled()
+def save_performance_profile(
+    values: np.ndarray,
+    min_val: float,
+    max_val: float,
+    filename: str = "result.dat",
+    num_thresholds: Optional[int] = 50,
+    seed: Optional[int] = None,
+    cache: Optional["ResultCache"] = None,
+    sidecar: bool = False,
+) -> None:
     """
     Save the performance profile and the 95% confidence interval.
 
@@ -136,6 +637,17 @@ def save_performance_profile(values: np.ndarray, min_val: float, max_val: float,
     :type max_val: float
     :param filename: Filename for saving, defaults to "result.dat".
     :type filename: str, optional
+    :param num_thresholds: Number of evenly spaced thresholds between min_val and max_val. If None, the exact
+        profile is saved, at every distinct value between min_val and max_val, defaults to 50
+    :type num_thresholds: Optional[int], optional
+    :param seed: Seed of the bootstrap resampling, defaults to None
+    :type seed: Optional[int], optional
+    :param cache: If set, reuse the result of a previous call with the same values and parameters. Only used with
+        a seed, as without one every call draws other resamples, defaults to None
+    :type cache: Optional[ResultCache], optional
+    :param sidecar: Also save the values in full precision to a binary sidecar, filename + ".npy", see
+        toolbox.dat.load_dat, defaults to False
+    :type sidecar: bool, optional
 
     ```
     timestep med lowq highq
@@ -144,27 +656,41 @@ def save_performance_profile(values: np.ndarray, min_val: float, max_val: float,
     -2.775 0.995 0.985 1.000
     ```
     """
-    thresholds = np.linspace(min_val, max_val, 50)
-    med, lowq, highq = performance_profile(values, thresholds)
+    if num_thresholds is None:
+        thresholds = np.unique(values)
+        thresholds = thresholds[(thresholds >= min_val) & (thresholds <= max_val)]
+    else:
+        thresholds = np.linspace(min_val, max_val, num_thresholds)
+    med, lowq, highq = performance_profile(values, thresholds, seed=seed, cache=cache)
     out = np.vstack((thresholds, med, lowq, highq)).transpose()
     header = " ".join(("thresholds", "med", "lowq", "highq"))
     fmt = " ".join(("%.3f", "%.3f", "%.3f", "%.3f"))
-    np.savetxt(filename, out, fmt=fmt, header=header, comments="")
+    write_dat(filename, out, fmt, header, sidecar=sidecar)
 
 
+@profiled()
 def save_median(
-    values: np.ndarray,
+    values: Union[np.ndarray, Sequence[np.ndarray]],
     timesteps: np.ndarray = None,
     step: int = 1,
     filename: str = "result.dat",
     target_length: Optional[int] = None,
+    downsampling: str = "nearest",
     quantiles: Optional[List] = None,
+    block_size: int = 2**16,
+    sidecar: bool = False,
 ) -> None:
     """
     Save the median score and optionnally quantiles.
 
-    :param values: The values as a matrix of the shape (num_runs x num_timesteps)
-    :type values: np.ndarray
+    The values are processed by blocks of timesteps, so that the values can be read lazily, for example from
+    memory-mapped arrays (see load_eval with mmap=True): the peak memory is bounded by the block size, not by the
+    total number of timesteps.
+
+    :param values: The values as a matrix of the shape (num_runs x num_timesteps), possibly memory-mapped, or
+        a sequence of arrays of shape (num_timesteps,), one per run. Runs of different lengths are truncated to the
+        shortest one. Trailing axes, such as the episodes of the evaluations read by load_eval, are averaged.
+    :type values: Union[np.ndarray, Sequence[np.ndarray]]
     :param timesteps: Timesteps as a 1D array of size num_timesteps, defaults to None
     :type timesteps: np.ndarray, optional
     :param step: When timesteps is None, use this number as number timesteps between values, defaults to 1
@@ -174,8 +700,15 @@ def save_median(
     :param target_length: The target number of elements in the output file. Downsample if necessary.
         If None, stores every inputs elements.
     :type target_length: Optional[int], optional
+    :param downsampling: The downsampling method, see rescale(), defaults to "nearest"
+    :type downsampling: str, optional
     :param quantiles: The quantiles to compute; values must be between 0 and 1
     :type quantiles: List or None, optional
+    :param block_size: Number of timesteps processed at once, defaults to 2**16
+    :type block_size: int, optional
+    :param sidecar: Also save the values in full precision to a binary sidecar, filename + ".npy", see
+        toolbox.dat.load_dat, defaults to False
+    :type sidecar: bool, optional
 
     When quantiles is set to [0.05, 0.95], the output file looks like
 
@@ -186,13 +719,94 @@ def save_median(
     75000 0.140 0.100 0.160
     ```
     """
-    timesteps = timesteps if timesteps is not None else np.arange(values.shape[1]) * step
+    num_timesteps = values.shape[1] if isinstance(values, np.ndarray) else min(len(run) for run in values)
+    timesteps = timesteps if timesteps is not None else np.arange(num_timesteps) * step
+    columns = np.arange(num_timesteps)
     if target_length is not None:
-        values, timesteps = rescale(values, timesteps, target_length)
-    med = np.median(values, axis=0)
+        signal = None
+        if downsampling != "nearest":
+            signal = np.concatenate([block.mean(axis=0) for block in _column_blocks(values, columns, block_size)])
+        columns = _rescale_indices(timesteps, target_length, downsampling, signal)
     quantiles = [] if quantiles is None else quantiles  # when quantile is None, turn it into []
-    qs = [np.quantile(values, q, axis=0) for q in quantiles]
-    out = np.vstack((timesteps, med, *qs)).transpose()
+    _write_median(
+        filename, values, timesteps[columns], quantiles, columns=columns, block_size=block_size, sidecar=sidecar
+    )
+
+
+def _column_blocks(
+    values: Union[np.ndarray, Sequence[np.ndarray]], columns: np.ndarray, block_size: int
+) -> Iterator[np.ndarray]:
+    # Yield the values of the columns as matrices of shape (num_runs x block_size), reading only these columns.
+    # The trailing axes, such as the evaluation episodes, are averaged.
+    for start in range(0, len(columns), block_size):
+        block_columns = columns[start : start + block_size]
+        if isinstance(values, np.ndarray):
+            if len(block_columns) and block_columns[-1] - block_columns[0] == len(block_columns) - 1:
+                block = np.asarray(values[:, block_columns[0] : block_columns[-1] + 1])  # Contiguous, slice
+            else:
+                block = values[:, block_columns]
+        else:
+            block = np.stack([run[block_columns] for run in values])
+        if block.ndim > 2:
+            block = block.reshape(block.shape[0], block.shape[1], -1).mean(axis=2)
+        yield block
+
+
+def _write_median(
+    filename: str,
+    values: Union[np.ndarray, Sequence[np.ndarray]],
+    timesteps: np.ndarray,
+    quantiles: List,
+    append: bool = False,
+    columns: Optional[np.ndarray] = None,
+    block_size: int = 2**16,
+    sidecar: bool = False,
+):
+    columns = np.arange(len(timesteps)) if columns is None else columns
     header = " ".join(("timestep", "med", *["q" + str(q) for q in quantiles]))
     fmt = " ".join(("%d", "%.3f", *["%.3f" for _ in quantiles]))
-    np.savetxt(filename, out, fmt=fmt, header=header, comments="")
+    for start, block in zip(range(0, len(columns), block_size), _column_blocks(values, columns, block_size)):
+        # All the quantiles in a single partition pass
+        with stage("to_dat.median.quantiles", size=block.size):
+            qs = np.quantile(block, [0.5, *quantiles], axis=0)
+        out = np.vstack((timesteps[start : start + block_size], *qs)).transpose()
+        write_dat(filename, out, fmt, header, append=append or start > 0, sidecar=sidecar)
+
+
+@profiled()
+def update_median(
+    values: np.ndarray,
+    timesteps: np.ndarray = None,
+    step: int = 1,
+    filename: str = "result.dat",
+    quantiles: Optional[List] = None,
+    sidecar: bool = False,
+) -> int:
+    """
+    Append the median score and optionnally quantiles of the new timesteps to a file written by save_median.
+
+    Only the timesteps greater than the last one of the file are computed, so the cost grows with the new data,
+    not with the full history. If the file does not exist, it is created.
+
+    :param values: The values as a matrix of the shape (num_runs x num_timesteps)
+    :type values: np.ndarray
+    :param timesteps: Timesteps as a 1D array of size num_timesteps, defaults to None
+    :type timesteps: np.ndarray, optional
+    :param step: When timesteps is None, use this number as number timesteps between values, defaults to 1
+    :type step: int, optional
+    :param filename: Filename for saving, defaults to "result.dat".
+    :type filename: str, optional
+    :param quantiles: The quantiles to compute, must be the same as in the existing file; values must be between 0
+        and 1
+    :type quantiles: List or None, optional
+    :param sidecar: Also append the values to the binary sidecar of the file, if it is up to date with the file,
+        see toolbox.dat.write_dat, defaults to False
+    :type sidecar: bool, optional
+    :return: The number of rows appended
+    :rtype: int
+    """
+    values, timesteps = _new_columns(values, timesteps, step, filename)
+    if values.shape[1] > 0:
+        quantiles = [] if quantiles is None else quantiles
+        _write_median(filename, values, timesteps, quantiles, append=True, sidecar=sidecar)
+    return values.shape[1]
@@ -1,14 +1,25 @@
-from typing import Union
+from typing import List, NamedTuple, Optional, Sequence, Tuple, Union
 
 import numpy as np
 
 
 def _to_array(a: Union[int, np.ndarray]) -> np.ndarray:
-    if type(a) is int:
-        a = np.ones(2, dtype=int) * a
+    # A size given as a scalar (an int or a numpy integer) applies to both dimensions
+    if np.ndim(a) == 0:
+        a = np.full(2, a)
     return a
 
 
+def _conv_output(input_size, kernel_size, stride, padding):
+    # Output size and whether the kernel exactly tiles the padded input, for sizes broadcasting together
+    span = input_size - kernel_size + 2 * padding
+    return span // stride + 1, span % stride == 0
+
+
+def _conv_transpose_output(input_size, kernel_size, stride, padding, output_padding):
+    return (input_size - 1) * stride - 2 * padding + (kernel_size - 1) + output_padding + 1
+
+
 def conv_2d(
     input_size: Union[int, np.ndarray],
     kernel_size: Union[int, np.ndarray],
@@ -29,12 +40,10 @@ def conv_2d(
     :return: The size of the output as numpy array
     :rtype: np.ndarray
     """
-    input_size = _to_array(input_size)
-    kernel_size = _to_array(kernel_size)
-    stride = _to_array(stride)
-    padding = _to_array(padding)
-    assert ((input_size - kernel_size + 2 * padding) % stride == 0).all()
-    return (input_size - kernel_size + 2 * padding) // stride + 1
+    # The sizes broadcast together, so only the output is converted to an array
+    output_size, exact = _conv_output(input_size, kernel_size, stride, padding)
+    assert np.all(exact)
+    return _to_array(output_size)
 
 
 def conv_transpose_2d(
@@ -59,11 +68,7 @@ def conv_transpose_2d(
     :return: The size of the output as numpy array
     :rtype: np.ndarray
     """
-    input_size = _to_array(input_size)
-    kernel_size = _to_array(kernel_size)
-    stride = _to_array(stride)
-    padding = _to_array(padding)
-    return (input_size - 1) * stride - 2 * padding + (kernel_size - 1) + output_padding + 1
+    return _to_array(_conv_transpose_output(input_size, kernel_size, stride, padding, output_padding))
 
 
 def pool_2d(
@@ -87,3 +92,180 @@ def pool_2d(
     :rtype: np.ndarray
     """
     return conv_2d(input_size, kernel_size, stride, padding)
+
+
+# Sizes of the layers of a plan: an int, an array of candidate values, or a (height, width) pair of those. All the
+# arrays of a plan broadcast together, so each axis can hold the candidates of a different hyperparameter.
+Size = Union[int, np.ndarray, Tuple[Union[int, np.ndarray], Union[int, np.ndarray]]]
+
+
+class Conv2d(NamedTuple):
+    """A Conv2D layer with bias, as in torch.nn.Conv2d."""
+
+    out_channels: Union[int, np.ndarray]
+    kernel_size: Size
+    stride: Size = 1
+    padding: Size = 0
+
+
+class ConvTranspose2d(NamedTuple):
+    """A ConvTranspose2D layer with bias, as in torch.nn.ConvTranspose2d."""
+
+    out_channels: Union[int, np.ndarray]
+    kernel_size: Size
+    stride: Size = 1
+    padding: Size = 0
+    output_padding: Size = 0
+
+
+class Pool2d(NamedTuple):
+    """A max or average Pool2D layer, as in torch.nn.MaxPool2d. The stride defaults to the kernel size."""
+
+    kernel_size: Size
+    stride: Optional[Size] = None
+    padding: Size = 0
+
+
+Layer = Union[Conv2d, ConvTranspose2d, Pool2d]
+
+
+class ArchitecturePlan(NamedTuple):
+    """
+    The shapes and costs of every layer of a stack, for every candidate. Each field has a leading axis over the
+    layers, followed by the broadcast shape of the candidates.
+
+    :param height: Output height
+    :param width: Output width
+    :param channels: Output channels
+    :param valid: Whether the output of the layer, and of all the previous ones, is non-empty
+    :param exact: Whether the kernel exactly tiles the padded input, as required by conv_2d, always True for
+        the transposed convolutions
+    :param receptive_field: Receptive field of an output pixel on the input of the stack, as (height, width) on
+        the last axis
+    :param params: Number of parameters
+    :param flops: Floating point operations for one sample: 2 per multiply-accumulate of the convolutions, 1 per
+        element of the pooling windows
+    :param activation_memory: Memory of the output for one sample, in bytes
+    """
+
+    height: np.ndarray
+    width: np.ndarray
+    channels: np.ndarray
+    valid: np.ndarray
+    exact: np.ndarray
+    receptive_field: np.ndarray
+    params: np.ndarray
+    flops: np.ndarray
+    activation_memory: np.ndarray
+
+    @property
+    def output_shape(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Output (channels, height, width) of the stack."""
+        return self.channels[-1], self.height[-1], self.width[-1]
+
+    @property
+    def total_params(self) -> np.ndarray:
+        """Number of parameters of the stack."""
+        return self.params.sum(axis=0)
+
+    @property
+    def total_flops(self) -> np.ndarray:
+        """Floating point operations of the stack for one sample."""
+        return self.flops.sum(axis=0)
+
+    @property
+    def peak_activation_memory(self) -> np.ndarray:
+        """Largest output of a layer for one sample, in bytes."""
+        return self.activation_memory.max(axis=0)
+
+
+def _pair(size: Size) -> Tuple[np.ndarray, np.ndarray]:
+    if isinstance(size, tuple):
+        return np.asarray(size[0]), np.asarray(size[1])
+    size = np.asarray(size)
+    return size, size
+
+
+def plan_architecture(
+    layers: Sequence[Layer],
+    input_size: Size,
+    in_channels: Union[int, np.ndarray] = 1,
+    bytes_per_element: int = 4,
+) -> ArchitecturePlan:
+    """
+    Compute the shapes and costs of a stack of layers, for arrays of input sizes and hyperparameters at once.
+
+    Every size of the input and of the layers can be an array. They all broadcast together, as in numpy, so a
+    whole design grid is evaluated with a few array operations per layer. For instance, with
+    kernel_size=np.array([3, 5])[:, None] and stride=np.array([1, 2, 4])[None, :], the plan has shape (2, 3).
+
+    :param layers: The layers, in order
+    :type layers: Sequence[Layer]
+    :param input_size: The input size, as an int or an array for square inputs, or a (height, width) pair
+    :type input_size: Size
+    :param in_channels: The input channels, defaults to 1
+    :type in_channels: Union[int, np.ndarray], optional
+    :param bytes_per_element: Size of an activation element in bytes, defaults to 4 (float32)
+    :type bytes_per_element: int, optional
+    :return: The plan
+    :rtype: ArchitecturePlan
+    """
+    if len(layers) == 0:
+        raise ValueError("The stack must have at least one layer")
+    sizes = _pair(input_size)
+    channels = np.asarray(in_channels)
+    valid = np.asarray(True)
+    # Receptive field and distance on the input between two adjacent pixels, per dimension
+    fields = [np.asarray(1.0), np.asarray(1.0)]
+    jumps = [np.asarray(1.0), np.asarray(1.0)]
+    rows: List[Tuple[np.ndarray, ...]] = []
+    for layer in layers:
+        kernels, paddings = _pair(layer.kernel_size), _pair(layer.padding)
+        strides = _pair(layer.kernel_size if isinstance(layer, Pool2d) and layer.stride is None else layer.stride)
+        window = kernels[0] * kernels[1]
+        if isinstance(layer, ConvTranspose2d):
+            output_paddings = _pair(layer.output_padding)
+            out_sizes = [
+                _conv_transpose_output(sizes[i], kernels[i], strides[i], paddings[i], output_paddings[i])
+                for i in range(2)
+            ]
+            exact = np.asarray(True)
+            for i in range(2):
+                # An output pixel depends on ceil(kernel / stride) input pixels
+                fields[i] = fields[i] + (-(-kernels[i] // strides[i]) - 1) * jumps[i]
+                jumps[i] = jumps[i] / strides[i]
+        else:
+            (out_height, exact_height), (out_width, exact_width) = (
+                _conv_output(sizes[i], kernels[i], strides[i], paddings[i]) for i in range(2)
+            )
+            out_sizes, exact = [out_height, out_width], exact_height & exact_width
+            for i in range(2):
+                fields[i] = fields[i] + (kernels[i] - 1) * jumps[i]
+                jumps[i] = jumps[i] * strides[i]
+        out_sizes = [np.maximum(out_size, 0) for out_size in out_sizes]
+        valid = valid & (out_sizes[0] > 0) & (out_sizes[1] > 0)
+        if isinstance(layer, Pool2d):
+            out_channels = channels
+            params = np.asarray(0)
+            flops = window * channels * out_sizes[0] * out_sizes[1]
+        else:
+            out_channels = np.asarray(layer.out_channels)
+            params = out_channels * (channels * window + 1)
+            # A convolution computes a window per output pixel, a transposed one scatters a window per input pixel
+            pixels = sizes[0] * sizes[1] if isinstance(layer, ConvTranspose2d) else out_sizes[0] * out_sizes[1]
+            flops = 2 * channels * window * out_channels * pixels
+        activation_memory = out_channels * out_sizes[0] * out_sizes[1] * bytes_per_element
+        receptive_field = np.stack(np.broadcast_arrays(*fields), axis=-1)
+        rows.append((*out_sizes, out_channels, valid, exact, receptive_field, params, flops, activation_memory))
+        sizes, channels = out_sizes, out_channels
+
+    # Broadcast the fields of all the layers to the same shape, to stack them along the layers
+    receptive_field_idx = ArchitecturePlan._fields.index("receptive_field")
+    shape = np.broadcast_shapes(
+        *(field.shape[:-1] if i == receptive_field_idx else field.shape for row in rows for i, field in enumerate(row))
+    )
+    stacked = []
+    for i in range(len(ArchitecturePlan._fields)):
+        field_shape = (*shape, 2) if i == receptive_field_idx else shape
+        stacked.append(np.stack([np.broadcast_to(row[i], field_shape) for row in rows]))
+    return ArchitecturePlan(*stacked)
@@ -0,0 +1,117 @@
+import glob
+import os
+import time
+import warnings
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from toolbox.profiling import profiled
+from toolbox.to_dat import last_timestep, load_eval, update_iqm, update_median
+
+
+def _new_values(
+    runs: List[Tuple[np.ndarray, np.ndarray]], timesteps: np.ndarray, filename: str
+) -> Tuple[np.ndarray, np.ndarray]:
+    # The values of the timesteps not already in the file, averaged over the episodes. Only these columns are read.
+    last = last_timestep(filename)
+    columns = np.arange(len(timesteps)) if last is None else np.flatnonzero(timesteps > last)
+    values = np.stack([np.asarray(run_values[columns]) for _, run_values in runs])
+    values = values.reshape(*values.shape[:2], int(np.prod(values.shape[2:]))).mean(axis=2)
+    return values, timesteps[columns]
+
+
+def _load_run(file: str, key: str) -> Tuple[np.ndarray, np.ndarray]:
+    # SB3 rewrites the evaluation files in place, so a file can be read while it is only partly written
+    import zipfile
+
+    try:
+        return load_eval(file, key, mmap=True)
+    except (zipfile.BadZipFile, EOFError, KeyError, ValueError) as error:
+        raise OSError(f"Could not read {file}, it may be being written: {error}") from error
+
+
+@profiled()
+def refresh(
+    files: List[str],
+    iqm_filename: Optional[str] = "iqm.dat",
+    median_filename: Optional[str] = "median.dat",
+    key: str = "results",
+    quantiles: Optional[List] = None,
+    seed: Optional[int] = None,
+) -> int:
+    """
+    Append the statistics of the evaluations not yet aggregated to the .dat files.
+
+    The values are averaged over the evaluation episodes, and the runs are truncated to the shortest one, so that
+    a timestep is only aggregated once every run has reached it. The evaluation files are memory-mapped, and only
+    the values of the new timesteps are read, so the cost of a refresh grows with the new evaluations, not with the
+    full history.
+
+    :param files: The evaluation files, one per run
+    :type files: List[str]
+    :param iqm_filename: Filename of the IQM, None to skip it, defaults to "iqm.dat"
+    :type iqm_filename: Optional[str], optional
+    :param median_filename: Filename of the median, None to skip it, defaults to "median.dat"
+    :type median_filename: Optional[str], optional
+    :param key: The key of the values, defaults to "results"
+    :type key: str, optional
+    :param quantiles: The quantiles to save with the median, defaults to None
+    :type quantiles: Optional[List], optional
+    :param seed: Seed of the bootstrap resampling, defaults to None
+    :type seed: Optional[int], optional
+    :return: The number of new timesteps
+    :rtype: int
+    :raises OSError: If an evaluation file can't be read, for example while it is being written
+    """
+    runs = [_load_run(file, key) for file in files]
+    length = min(len(run_timesteps) for run_timesteps, _ in runs)
+    timesteps = np.asarray(runs[0][0][:length])
+    num_new = 0
+    if iqm_filename is not None:
+        values, new_timesteps = _new_values(runs, timesteps, iqm_filename)
+        num_new = update_iqm(values, new_timesteps, filename=iqm_filename, seed=seed)
+    if median_filename is not None:
+        values, new_timesteps = _new_values(runs, timesteps, median_filename)
+        num_new = max(num_new, update_median(values, new_timesteps, filename=median_filename, quantiles=quantiles))
+    return num_new
+
+
+def watch(
+    run_dir: str,
+    pattern: str = "**/evaluations.npz",
+    interval: float = 60.0,
+    max_iterations: Optional[int] = None,
+    **kwargs,
+) -> None:
+    """
+    Watch a run directory, and refresh the .dat files whenever an evaluation file changes.
+
+    Only the new timesteps are aggregated and appended, see refresh(). When an evaluation file can't be read, for
+    example because it is being written, a warning is issued and the refresh is retried at the next poll.
+
+    :param run_dir: The run directory
+    :type run_dir: str
+    :param pattern: Glob pattern of the evaluation files, relative to run_dir, defaults to "**/evaluations.npz"
+    :type pattern: str, optional
+    :param interval: Polling interval in seconds, defaults to 60.0
+    :type interval: float, optional
+    :param max_iterations: Stop after this number of polls, defaults to None (never stop)
+    :type max_iterations: Optional[int], optional
+    :param kwargs: Passed to refresh()
+    """
+    mtimes: Dict[str, float] = {}
+    iteration = 0
+    while max_iterations is None or iteration < max_iterations:
+        files = sorted(glob.glob(os.path.join(run_dir, pattern), recursive=True))
+        new_mtimes = {file: os.path.getmtime(file) for file in files}
+        if files and new_mtimes != mtimes:
+            try:
+                refresh(files, **kwargs)
+            except OSError as error:
+                warnings.warn(f"{error}, retrying at the next poll")  # The previous mtimes are kept
+            else:
+                mtimes = new_mtimes
+        iteration += 1
+        if max_iterations is None or iteration < max_iterations:
+            time.sleep(interval)